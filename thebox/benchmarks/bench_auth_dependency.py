@@ -0,0 +1,56 @@
+"""
+Per-request cost of get_current_user: full HS256 jwt.decode (plus the Redis
+revocation check every token this worker has not verified yet gets) vs. the
+verified-token cache. Needs the app's Redis.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_auth_dependency [--requests 100000] [--users 1000]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from security.dependencies import get_current_user
+from security.main import create_access_token
+from security.token_cache import TOKEN_CACHE
+
+
+async def measure(creds, requests: int, cached: bool) -> float:
+    rng = random.Random(11)
+    TOKEN_CACHE.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            TOKEN_CACHE.clear()
+        await get_current_user(rng.choice(creds))
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(requests: int, users: int):
+    creds = [
+        HTTPAuthorizationCredentials(
+            scheme="Bearer",
+            credentials=create_access_token({"user_id": f"user-{i}", "username": f"user{i}"})
+        )
+        for i in range(users)
+    ]
+    uncached = await measure(creds, requests, cached=False)
+    cached = await measure(creds, requests, cached=True)
+    print(f"{requests} requests over {users} tokens")
+    print(f"jwt.decode + Redis check : {uncached:8.2f} us/request")
+    print(f"verified-token cache     : {cached:8.2f} us/request (hit ratio {TOKEN_CACHE.hits / max(1, TOKEN_CACHE.hits + TOKEN_CACHE.misses):.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Cached payload formats: legacy json.dumps text vs. db.cache_codec (JSON / msgpack,
+with and without zlib) on story documents and recommendation lists.
+Reports encode/decode time and payload size; with --redis also Redis MEMORY USAGE.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_cache_codec [--stories 20] [--engagement 200] [--redis]
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from db import cache_codec
+
+ROUNDS = 200
+FORMATS = (
+    ("msgpack", 0),
+    ("msgpack", cache_codec.COMPRESS_THRESHOLD),
+    ("json", 0),
+    ("json", cache_codec.COMPRESS_THRESHOLD),
+)
+
+
+def _user(rng):
+    n = rng.randrange(100_000)
+    return {"user_id": str(uuid4()), "username": f"user{n}", "profile_pic": f"http://localhost:8000/media/avatars/{n}.jpg"}
+
+
+def story_document(rng, stories: int, engagement: int) -> dict:
+    """Shape of a `stories:{user_id}` entry, with the nested engagement lists filled."""
+    owner = _user(rng)
+    now = datetime(2025, 1, 1)
+    docs = []
+    for _ in range(stories):
+        views = []
+        for _ in range(engagement):
+            viewer = _user(rng)
+            views.append({"user_id": viewer["user_id"], "viewer": viewer,
+                          "viewed_at": (now - timedelta(seconds=rng.randrange(86400))).isoformat()})
+        reactions = [{
+            "user_id": str(uuid4()),
+            "reaction_story": {"story_id": str(uuid4()), "author_id": str(uuid4()),
+                               "thumbnail_url": f"http://localhost:8000/media/{uuid4().hex}.jpg",
+                               "content_type": "image", "caption": "so good", "timestamp": now.isoformat()},
+            "reacted_at": now.isoformat(),
+        } for _ in range(engagement // 10)]
+        docs.append({
+            "story_id": str(uuid4()),
+            "user": owner,
+            "details": {"content_url": f"http://localhost:8000/media/{uuid4().hex}.mp4", "content_type": "video",
+                        "caption": "weekend hike with the crew " * 3, "mentions": [f"user{i}" for i in range(3)]},
+            "counts": {"views": len(views), "reactions": len(reactions), "reposts": 0, "shares": 0},
+            "views": views,
+            "reactions": reactions,
+            "reposts": [],
+            "shares": [],
+        })
+    return {"_id": uuid4().hex[:24], "user": owner, "stories": docs}
+
+
+def recommendations(rng) -> list:
+    """Shape of a `recommendations:{user_id}` / explore entry."""
+    return [{
+        **_user(rng),
+        "score": rng.randrange(10, 120),
+        "shared_tags": rng.sample(["music", "travel", "fitness", "coding", "art", "food", "gaming"], 3),
+        "reason": "Shared interests",
+    } for _ in range(30)]
+
+
+def measure(value, codec: str, threshold: int):
+    encoded = cache_codec.encode(value, codec, threshold)
+    enc = timeit.timeit(lambda: cache_codec.encode(value, codec, threshold), number=ROUNDS) / ROUNDS
+    dec = timeit.timeit(lambda: cache_codec.decode(encoded), number=ROUNDS) / ROUNDS
+    return encoded, enc, dec
+
+
+def legacy(value):
+    encoded = json.dumps(value).encode()
+    enc = timeit.timeit(lambda: json.dumps(value), number=ROUNDS) / ROUNDS
+    dec = timeit.timeit(lambda: json.loads(encoded), number=ROUNDS) / ROUNDS
+    return encoded, enc, dec
+
+
+def redis_memory(payloads):
+    import redis
+    client = redis.Redis(host="127.0.0.1", port=6379, db=0)
+    usage = []
+    for i, payload in enumerate(payloads):
+        key = f"bench:codec:{i}"
+        client.set(key, payload, ex=60)
+        usage.append(client.memory_usage(key))
+        client.delete(key)
+    return usage
+
+
+def run(stories: int, engagement: int, use_redis: bool):
+    rng = random.Random(5)
+    payloads = {
+        f"story doc ({stories} stories x {engagement} views)": story_document(rng, stories, engagement),
+        "recommendations (30 users)": recommendations(rng),
+    }
+    for label, value in payloads.items():
+        rows = [("json.dumps (legacy)", *legacy(value))]
+        for codec, threshold in FORMATS:
+            name = f"{codec}{' + zlib' if threshold else ''}"
+            rows.append((name, *measure(value, codec, threshold)))
+        memory = redis_memory([r[1] for r in rows]) if use_redis else [None] * len(rows)
+
+        print(f"\n{label}")
+        for (name, encoded, enc, dec), mem in zip(rows, memory):
+            line = f"  {name:20} {len(encoded):>9} B   encode {enc * 1e6:9.1f} us   decode {dec * 1e6:9.1f} us"
+            if mem is not None:
+                line += f"   redis {mem:>9} B"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stories", type=int, default=20)
+    parser.add_argument("--engagement", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="also report MEMORY USAGE from a local Redis")
+    args = parser.parse_args()
+    run(args.stories, args.engagement, args.redis)
+
+
+if __name__ == "__main__":
+    main()
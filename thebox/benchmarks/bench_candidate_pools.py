@@ -0,0 +1,150 @@
+"""
+Recommendation candidate lookup latency at scale: the live Mongo `$or`/`$in` tag
+query + Python re-scoring vs. the precomputed Redis pools (candidate_pools).
+
+Seeds --users synthetic signatures into a scratch Redis db (and, with --mongo, a
+scratch Mongo collection) on first run, then reports p50/p99 per recommendation.
+
+Run from the `thebox` directory (needs a local Redis; --mongo also needs MongoDB):
+    python -m benchmarks.bench_candidate_pools [--users 1000000] [--requests 2000] [--mongo]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from db.redis_client import TracedRedis
+from db.models.users import ProfileSignature
+from routers.automations.recommendations import candidate_pools
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+from routers.automations.recommendations.profile_signature import matching_tags
+
+SEED_BATCH = 2000
+LOCATIONS = ["lagos", "nairobi", "london", "new york", "berlin", "tokyo", "accra", "paris"]
+CATEGORIES = [c.casefold() for c in CATEGORY_KEYWORDS]
+VOCABULARY = [kw.casefold() for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+# Popular tags are much more common than the long tail
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_user(rng: random.Random, i: int) -> dict:
+    return {
+        "user_id": f"bench-{i}",
+        "username": f"bench{i}",
+        "profile_signature": {
+            "interests": rng.choices(VOCABULARY, TAG_WEIGHTS, k=rng.randint(2, 6)),
+            "bio_tags": rng.choices(VOCABULARY, TAG_WEIGHTS, k=rng.randint(0, 4)),
+            "behavioral_tags": rng.sample(CATEGORIES, rng.randint(0, 2)),
+            "category": rng.sample(CATEGORIES, rng.randint(1, 3)),
+            "location": rng.choice(LOCATIONS),
+            "category_test": {},
+            "profile_score": rng.randint(25, 200),
+        },
+    }
+
+
+def legacy_query(tags):
+    return {
+        "profile_signature": {"$exists": True},
+        "$or": [
+            {"profile_signature.behavioral_tags": {"$in": tags}},
+            {"profile_signature.interests": {"$in": tags}},
+            {"profile_signature.bio_tags": {"$in": tags}},
+            {"profile_signature.category": {"$in": tags}},
+        ],
+    }
+
+
+async def legacy_recommend(collection, signature: ProfileSignature):
+    tags = matching_tags(signature)
+    users = await collection.find(legacy_query(tags)).limit(100).to_list(100)
+    scored = []
+    for user in users:
+        shared = set(tags) & set(matching_tags(ProfileSignature(**user["profile_signature"])))
+        if shared:
+            scored.append((len(shared) * 5 + user["profile_signature"]["profile_score"], user["user_id"]))
+    scored.sort(reverse=True)
+    return scored[:30]
+
+
+async def pooled_recommend(signature: ProfileSignature):
+    location_key = candidate_pools.LOCATION_POOL_KEY.format(signature.location)
+    return await asyncio.gather(
+        candidate_pools.match_candidates(matching_tags(signature)),
+        candidate_pools.top_by_score(candidate_pools.ALL_POOL_KEY, min_score=50, count=10),
+        candidate_pools.top_by_score(location_key, min_score=50, count=5),
+        candidate_pools.top_by_score(location_key, max_score=40, count=20, highest_first=False),
+    )
+
+
+async def seed_redis(users: int):
+    have = await candidate_pools.redis_client.zcard(candidate_pools.ALL_POOL_KEY)
+    rng = random.Random(have)
+    for start in range(have, users, SEED_BATCH):
+        await candidate_pools.sync_user_pools([make_user(rng, i) for i in range(start, min(start + SEED_BATCH, users))])
+        print(f"\r  redis pools seeded {min(start + SEED_BATCH, users):,}/{users:,}", end="", flush=True)
+    print()
+
+
+async def seed_mongo(collection, users: int):
+    # Indexes for the legacy query (db.indexes does not create them)
+    from pymongo import IndexModel
+    await collection.create_indexes([
+        IndexModel([(f"profile_signature.{field}", 1)], name=f"sig_{field}")
+        for field in ("behavioral_tags", "interests", "bio_tags", "category")
+    ])
+    have = await collection.estimated_document_count()
+    rng = random.Random(have)
+    for start in range(have, users, SEED_BATCH):
+        await collection.insert_many([make_user(rng, i) for i in range(start, min(start + SEED_BATCH, users))], ordered=False)
+        print(f"\r  mongo users seeded {min(start + SEED_BATCH, users):,}/{users:,}", end="", flush=True)
+    print()
+
+
+async def latencies(fn, signatures) -> list:
+    samples = []
+    for signature in signatures:
+        started = time.perf_counter()
+        await fn(signature)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples
+
+
+def report(label: str, samples: list):
+    p = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    print(f"{label:22}: p50 {p(0.50):8.2f} ms   p99 {p(0.99):8.2f} ms   max {samples[-1]:8.2f} ms")
+
+
+async def run(args):
+    # Keep the bench data out of the app's Redis db
+    candidate_pools.redis_client = TracedRedis(host="127.0.0.1", port=6379, db=args.redis_db, decode_responses=True)
+    await seed_redis(args.users)
+
+    rng = random.Random(99)
+    signatures = [ProfileSignature(**make_user(rng, -1)["profile_signature"]) for _ in range(args.requests)]
+    print(f"{args.users:,} users, {args.requests} recommendation lookups")
+    report("redis candidate pools", await latencies(pooled_recommend, signatures))
+
+    if args.mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        collection = client[args.db].bench_candidate_users
+        await seed_mongo(collection, args.users)
+        report("mongo $or + rescoring", await latencies(lambda s: legacy_recommend(collection, s), signatures))
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--redis-db", type=int, default=15)
+    parser.add_argument("--mongo", action="store_true", help="also time the legacy Mongo query path")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="bench")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+infer_categories: category x keyword-list scan vs. the inverted CategoryIndex.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_category_index
+"""
+import random
+import timeit
+from collections import defaultdict
+
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+from routers.automations.recommendations.category_index import CategoryIndex
+
+SIGNATURES = 200
+TAGS_PER_SOURCE = (40, 60)  # 120-180 tags per signature across the three sources
+ROUNDS = 5
+
+KEYWORDS = {c.casefold(): [kw.casefold() for kw in kws] for c, kws in CATEGORY_KEYWORDS.items()}
+INDEX = CategoryIndex(KEYWORDS)
+
+
+def legacy_infer(bio_tags, interests, behavioral_tags):
+    category_scores = defaultdict(int)
+    for source in [bio_tags, interests, behavioral_tags]:
+        for tag in source:
+            tag_norm = tag.casefold()
+            for category, keywords in KEYWORDS.items():
+                if tag_norm in keywords:
+                    category_scores[category] += 1
+    for tag in behavioral_tags:
+        tag_norm = tag.casefold()
+        for category, keywords in KEYWORDS.items():
+            if tag_norm in keywords:
+                category_scores[category] += 1
+    return [cat for cat, score in category_scores.items() if score >= 2]
+
+
+def indexed_infer(bio_tags, interests, behavioral_tags):
+    return INDEX.infer([(bio_tags, 1), (interests, 1), (behavioral_tags, 2)])
+
+
+def make_signature(rng: random.Random):
+    vocabulary = [kw for kws in KEYWORDS.values() for kw in kws] + ["unknown", "misc", "stuff"]
+    return tuple(rng.sample(vocabulary, rng.randint(*TAGS_PER_SOURCE)) for _ in range(3))
+
+
+def main():
+    rng = random.Random(7)
+    signatures = [make_signature(rng) for _ in range(SIGNATURES)]
+
+    for sig in signatures:
+        assert legacy_infer(*sig) == indexed_infer(*sig), "index output differs from legacy"
+
+    legacy = min(timeit.repeat(lambda: [legacy_infer(*s) for s in signatures], number=1, repeat=ROUNDS))
+    indexed = min(timeit.repeat(lambda: [indexed_infer(*s) for s in signatures], number=1, repeat=ROUNDS))
+
+    print(f"{SIGNATURES} signatures, {TAGS_PER_SOURCE[0] * 3}-{TAGS_PER_SOURCE[1] * 3} tags each")
+    print(f"legacy scan    : {legacy / SIGNATURES * 1e6:9.1f} us/signature")
+    print(f"CategoryIndex  : {indexed / SIGNATURES * 1e6:9.1f} us/signature")
+    print(f"speedup        : {legacy / indexed:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Bio tagging: per-keyword regex scan vs. the compiled KeywordMatcher.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_keyword_matcher
+"""
+import random
+import re
+import timeit
+
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+from routers.automations.recommendations.keyword_matcher import KeywordMatcher
+
+BIO_LENGTH = 2000
+BIOS = 50
+ROUNDS = 5
+
+KEYWORDS = {c.casefold(): [kw.casefold() for kw in kws] for c, kws in CATEGORY_KEYWORDS.items()}
+MATCHER = KeywordMatcher(kw for kws in KEYWORDS.values() for kw in kws)
+FILLER = "the and with my love daily life just about really people we you".split()
+
+
+def legacy_extract(bio: str) -> set:
+    tags = set()
+    bio_norm = bio.casefold()
+    for keywords in KEYWORDS.values():
+        for keyword in keywords:
+            if re.search(rf"\b{re.escape(keyword)}\b", bio_norm):
+                tags.add(keyword)
+    return tags
+
+
+def make_bio(rng: random.Random) -> str:
+    all_keywords = [kw for kws in KEYWORDS.values() for kw in kws]
+    words = []
+    while sum(len(w) + 1 for w in words) < BIO_LENGTH:
+        word = rng.choice(all_keywords) if rng.random() < 0.3 else rng.choice(FILLER)
+        words.append(word.upper() if rng.random() < 0.1 else word)
+    return " ".join(words)[:BIO_LENGTH]
+
+
+def main():
+    rng = random.Random(42)
+    bios = [make_bio(rng) for _ in range(BIOS)]
+
+    for bio in bios:
+        assert legacy_extract(bio) == MATCHER.find(bio), "matcher output differs from legacy"
+
+    legacy = min(timeit.repeat(lambda: [legacy_extract(b) for b in bios], number=1, repeat=ROUNDS))
+    compiled = min(timeit.repeat(lambda: [MATCHER.find(b) for b in bios], number=1, repeat=ROUNDS))
+
+    print(f"{BIOS} bios x {BIO_LENGTH} chars, {len(MATCHER.keywords)} keywords")
+    print(f"legacy per-keyword regex : {legacy / BIOS * 1000:8.3f} ms/bio")
+    print(f"KeywordMatcher           : {compiled / BIOS * 1000:8.3f} ms/bio")
+    print(f"speedup                  : {legacy / compiled:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Login storm: latency of an unrelated endpoint while bcrypt verifications run,
+with bcrypt inline on the event loop vs. in the bounded security.passwords pool.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_login_storm [--logins 200] [--pings 400]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from security import passwords
+
+PASSWORD = "hunter2-password"
+
+
+def make_app(inline: bool, hashed: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login():
+        if inline:
+            ok = passwords.pwd_context.verify(PASSWORD, hashed)
+        else:
+            ok = await passwords.verify_password(PASSWORD, hashed)
+        return {"ok": ok}
+
+    @app.get("/ping")
+    async def ping():
+        return {"pong": True}
+
+    return app
+
+
+async def storm(app: FastAPI, logins: int, pings: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed_ping():
+            started = time.perf_counter()
+            await client.get("/ping")
+            return (time.perf_counter() - started) * 1000
+
+        async def login():
+            resp = await client.post("/login")
+            return resp.status_code
+
+        async def pinger():
+            latencies = []
+            for _ in range(pings):
+                latencies.append(await timed_ping())
+                await asyncio.sleep(0.002)
+            return latencies
+
+        login_tasks = [asyncio.create_task(login()) for _ in range(logins)]
+        latencies = await pinger()
+        statuses = await asyncio.gather(*login_tasks, return_exceptions=True)
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    shed = sum(1 for s in statuses if s == 503)
+    return statistics.median(latencies), p99, shed
+
+
+async def run(logins: int, pings: int):
+    rounds = await passwords.configure_password_hashing()
+    hashed = passwords.pwd_context.hash(PASSWORD)
+    print(f"bcrypt rounds={rounds}, {logins} concurrent logins, {pings} pings")
+
+    for label, inline in (("inline bcrypt", True), ("worker pool", False)):
+        p50, p99, shed = await storm(make_app(inline, hashed), logins, pings)
+        print(f"{label:14}: /ping p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   logins shed (503): {shed}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--pings", type=int, default=400)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.pings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Seek-heavy video playback: StaticFiles mount vs. the /media router.
+
+A player opens a video, seeks to random positions fetching RANGE_KB windows,
+then comes back later and revalidates with If-None-Match. Reports requests/s
+and response bytes for both apps, in-process through httpx's ASGI transport.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_media_serving [--size 200] [--seeks 500]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+import routers.crud.media as media_store
+import routers.media as media_routes
+
+RANGE_KB = 512
+
+
+async def playback(client: httpx.AsyncClient, url: str, size: int, seeks: int, rng: random.Random):
+    sent = requests = 0
+    etag = None
+    started = time.perf_counter()
+    for _ in range(seeks):
+        start = rng.randrange(0, size - RANGE_KB * 1024)
+        resp = await client.get(url, headers={"Range": f"bytes={start}-{start + RANGE_KB * 1024 - 1}"})
+        etag = resp.headers.get("etag", etag)
+        sent += len(resp.content)
+        requests += 1
+    # Revisit: the browser revalidates what it already has
+    for _ in range(seeks // 5):
+        resp = await client.get(url, headers={"If-None-Match": etag} if etag else {})
+        sent += len(resp.content)
+        requests += 1
+    return requests, sent, time.perf_counter() - started
+
+
+async def run(size_mb: int, seeks: int):
+    with tempfile.TemporaryDirectory() as media_dir:
+        data = os.urandom(size_mb * 1024 * 1024)
+        name = media_store.media_name(hashlib.sha256(data).hexdigest(), ".mp4")
+        os.makedirs(os.path.join(media_dir, os.path.dirname(name)))
+        with open(os.path.join(media_dir, name), "wb") as f:
+            f.write(data)
+        size = len(data)
+        del data
+
+        media_routes.MEDIA_DIR = media_dir
+        static_app = FastAPI()
+        static_app.mount("/media", StaticFiles(directory=media_dir), name="media")
+        router_app = FastAPI()
+        router_app.include_router(media_routes.router)
+
+        for label, app in (("StaticFiles", static_app), ("/media router", router_app)):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                requests, sent, elapsed = await playback(client, f"/media/{name}", size, seeks, random.Random(3))
+            print(f"{label:14}: {requests / elapsed:8.1f} req/s, {sent / 1024 / 1024:9.1f} MB sent, {elapsed:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200, help="video size in MB")
+    parser.add_argument("--seeks", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.seeks))
+
+
+if __name__ == "__main__":
+    main()
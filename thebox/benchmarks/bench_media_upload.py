@@ -0,0 +1,77 @@
+"""
+Peak memory of concurrent media uploads: read-whole-file vs. streamed chunks.
+
+Each simulated upload yields its body in 64 KiB pieces the way Starlette's
+UploadFile does. Peak traced Python allocations are reported for N concurrent
+uploads of SIZE MB each.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_media_upload                 # streaming, 20 x 200 MB
+    python -m benchmarks.bench_media_upload --legacy        # old path (needs ~N*SIZE of RAM)
+    python -m benchmarks.bench_media_upload --uploads 5 --size 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+import aiofiles
+
+from routers.crud.media import stream_upload_to_disk
+
+PIECE = 64 * 1024
+
+
+class FakeUpload:
+    """Minimal async UploadFile stand-in that generates `size` bytes lazily."""
+
+    def __init__(self, size: int):
+        self.remaining = size
+        self.piece = os.urandom(PIECE)
+
+    async def read(self, n: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        await asyncio.sleep(0)
+        return (self.piece * (n // PIECE + 1))[:n]
+
+
+async def legacy_upload(file: FakeUpload, dest_path: str, max_size: int):
+    async with aiofiles.open(dest_path, "wb") as out_file:
+        await out_file.write(await file.read())
+
+
+async def run(uploads: int, size_mb: int, legacy: bool):
+    size = size_mb * 1024 * 1024
+    handler = legacy_upload if legacy else stream_upload_to_disk
+    with tempfile.TemporaryDirectory() as media_dir:
+        tracemalloc.start()
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            handler(FakeUpload(size), os.path.join(media_dir, f"{i}.mp4"), size)
+            for i in range(uploads)
+        ])
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"{'legacy read()' if legacy else 'streaming'}: {uploads} x {size_mb} MB")
+    print(f"  peak traced memory : {peak / 1024 / 1024:10.1f} MB")
+    print(f"  wall time          : {elapsed:10.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--size", type=int, default=200, help="MB per upload")
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.uploads, args.size, args.legacy))
+
+
+if __name__ == "__main__":
+    main()
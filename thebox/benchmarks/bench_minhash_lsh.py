@@ -0,0 +1,106 @@
+"""
+"Similar users": exact Jaccard over every signature vs. MinHash LSH buckets, for
+several band / row splits of the sketch, with the shortlist re-ranked by estimated
+(MinHash) or exact (what the stored signature vectors give) Jaccard. Reports
+recall@N against the exact top N (tie-aware: an LSH result counts if its true
+Jaccard reaches the N-th best) and per-query latency. Runs in memory; the app
+keeps the buckets in Redis and reads only LSH_BUCKET_FETCH members of each (in
+user id order, since every bucket member scores 0), which is simulated here.
+Pass --bucket-fetch 0 to read whole buckets.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_minhash_lsh [--users 50000] [--queries 200] [--top 10]
+"""
+import argparse
+import random
+import time
+from collections import Counter, defaultdict
+
+from routers.automations.recommendations import minhash
+from routers.automations.recommendations.candidate_pools import LSH_BUCKET_FETCH, SIMILAR_CANDIDATES
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+
+CATEGORIES = [c.casefold() for c in CATEGORY_KEYWORDS]
+VOCABULARY = [kw.casefold() for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_tags(rng: random.Random) -> set:
+    # A couple of home categories, most tags drawn from their keywords
+    home = rng.sample(list(CATEGORY_KEYWORDS), rng.randint(1, 2))
+    tags = {c.casefold() for c in home}
+    for category in home:
+        keywords = CATEGORY_KEYWORDS[category]
+        tags.update(kw.casefold() for kw in rng.sample(keywords, min(len(keywords), rng.randint(3, 8))))
+    tags.update(rng.choices(VOCABULARY, TAG_WEIGHTS, k=rng.randint(0, 3)))
+    return tags
+
+
+def exact_top(query: set, users: list, top: int) -> list:
+    scored = [(minhash.jaccard(query, tags), i) for i, tags in enumerate(users)]
+    scored.sort(reverse=True)
+    return scored[:top]
+
+
+def lsh_top(query: set, buckets: dict, bands: int, similarity, top: int, candidates: int) -> list:
+    query_sketch = minhash.sketch(query)
+    hits = Counter()
+    for key in minhash.band_keys(query_sketch, bands):
+        hits.update(buckets.get(key, ()))
+    shortlist = [i for i, _ in hits.most_common(candidates)]
+    scored = [(similarity(query, query_sketch, i), i) for i in shortlist]
+    scored.sort(reverse=True)
+    return [i for s, i in scored[:top] if s > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=SIMILAR_CANDIDATES, help="shortlist re-ranked by similarity")
+    parser.add_argument("--bucket-fetch", type=int, default=LSH_BUCKET_FETCH, help="members read per bucket (0 = all)")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    users = [make_tags(rng) for _ in range(args.users)]
+    # Stand-in for user ids: Redis returns equal-score members in id order
+    user_ids = [rng.random() for _ in users]
+    started = time.perf_counter()
+    sketches = [minhash.sketch(tags) for tags in users]
+    print(f"{args.users:,} users, {minhash.NUM_PERM} permutations, "
+          f"sketched in {(time.perf_counter() - started) / args.users * 1e6:.1f} us/user")
+
+    queries = [make_tags(rng) for _ in range(args.queries)]
+    started = time.perf_counter()
+    truth = [exact_top(q, users, args.top) for q in queries]
+    exact_ms = (time.perf_counter() - started) / args.queries * 1000
+    print(f"exact Jaccard scan                     : {exact_ms:8.2f} ms/query")
+
+    rerankers = {
+        "minhash": lambda q, q_sketch, i: minhash.estimate_similarity(q_sketch, sketches[i]),
+        "exact": lambda q, q_sketch, i: minhash.jaccard(q, users[i]),
+    }
+    for bands in (8, 16, 32):
+        buckets = defaultdict(list)
+        for i, values in enumerate(sketches):
+            for key in minhash.band_keys(values, bands):
+                buckets[key].append(i)
+        if args.bucket_fetch:
+            for key, members in buckets.items():
+                buckets[key] = sorted(members, key=user_ids.__getitem__, reverse=True)[:args.bucket_fetch]
+
+        for name, similarity in rerankers.items():
+            found, started = 0, time.perf_counter()
+            results = [lsh_top(q, buckets, bands, similarity, args.top, args.candidates) for q in queries]
+            lsh_ms = (time.perf_counter() - started) / args.queries * 1000
+            for q, best, result in zip(queries, truth, results):
+                cutoff = best[-1][0]
+                found += min(len(best), sum(minhash.jaccard(q, users[i]) >= cutoff for i in result))
+            recall = found / sum(len(best) for best in truth)
+            print(f"LSH {bands:2} bands x {minhash.NUM_PERM // bands} rows, {name:7} re-rank : {lsh_ms:8.2f} ms/query   "
+                  f"recall@{args.top} {recall:6.1%}   ({exact_ms / lsh_ms:5.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
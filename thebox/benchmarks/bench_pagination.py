@@ -0,0 +1,74 @@
+"""
+Page latency at increasing depth: skip/limit vs. keyset cursors (routers.crud.pagination).
+
+Seeds a throwaway collection with --docs user-shaped documents (string _ids, like
+`users`) on first run, then times fetching one page at each offset.
+
+Run from the `thebox` directory (needs a local MongoDB):
+    python -m benchmarks.bench_pagination [--docs 1100000] [--offsets 10000 100000 1000000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from routers.crud.pagination import encode_cursor, fetch_page
+
+PAGE = 20
+REPEATS = 5
+SEED_BATCH = 10_000
+
+
+async def seed(collection, docs: int):
+    have = await collection.estimated_document_count()
+    for start in range(have, docs, SEED_BATCH):
+        batch = [
+            {"_id": f"user-{i:09d}", "username": f"user{i}", "profile_image_url": None}
+            for i in range(start, min(start + SEED_BATCH, docs))
+        ]
+        await collection.insert_many(batch, ordered=False)
+        print(f"\r  seeded {start + len(batch):,}/{docs:,}", end="", flush=True)
+    print()
+
+
+async def timed(page_fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await page_fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(mongo_url: str, db_name: str, docs: int, offsets):
+    client = AsyncIOMotorClient(mongo_url)
+    collection = client[db_name].bench_pagination
+    await seed(collection, docs)
+
+    print(f"page size {PAGE}, median of {REPEATS}")
+    for offset in offsets:
+        if offset >= docs:
+            print(f"  offset {offset:>9,}: skipped (only {docs:,} docs)")
+            continue
+        # The cursor a client would hold after paging to `offset`
+        cursor = encode_cursor(f"user-{offset - 1:09d}")
+        skip_ms = await timed(lambda: fetch_page(collection, {}, PAGE, skip=offset))
+        keyset_ms = await timed(lambda: fetch_page(collection, {}, PAGE, cursor=cursor))
+        print(f"  offset {offset:>9,}: skip/limit {skip_ms:9.2f} ms   cursor {keyset_ms:7.2f} ms")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="bench")
+    parser.add_argument("--docs", type=int, default=1_100_000)
+    parser.add_argument("--offsets", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    asyncio.run(run(args.mongo_url, args.db, args.docs, args.offsets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Candidate scoring: a ProfileSignature + matching_tags + set intersection per
+candidate vs. one score_candidates pass over the stored signature vectors.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_signature_vectors [--candidates 5000]
+"""
+import argparse
+import random
+import timeit
+
+from db.models.users import ProfileSignature
+from routers.automations.recommendations.profile_signature import matching_tags
+from routers.automations.recommendations.signature_vectors import (
+    VECTOR_BYTES, VECTOR_FIELD, VOCABULARY, score_candidates, signature_vector
+)
+
+ROUNDS = 5
+CATEGORIES = VOCABULARY[:30]
+EXTRA_TAGS = ["knitting", "birdwatching", "sourdough", "chess"]  # outside the vocabulary
+
+
+def make_signature(rng: random.Random) -> dict:
+    vocabulary = VOCABULARY + EXTRA_TAGS
+    return {
+        "interests": rng.sample(vocabulary, rng.randint(2, 8)),
+        "bio_tags": rng.sample(vocabulary, rng.randint(0, 6)),
+        "behavioral_tags": rng.sample(CATEGORIES, rng.randint(0, 3)),
+        "category": rng.sample(CATEGORIES, rng.randint(1, 3)),
+        "location": None,
+        "category_test": {},
+        "profile_score": rng.randint(25, 200),
+    }
+
+
+def legacy_score(tags, users):
+    return [
+        sorted(set(tags) & set(matching_tags(ProfileSignature(**u["profile_signature"]))))
+        for u in users
+    ]
+
+
+def vector_score(tags, users):
+    return [shared for _, shared in score_candidates(tags, users)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    users = []
+    for _ in range(args.candidates):
+        signature = make_signature(rng)
+        users.append({"profile_signature": signature, VECTOR_FIELD: signature_vector(signature)})
+    tags = matching_tags(ProfileSignature(**make_signature(rng)))
+
+    # Shared tags are only named for the vocabulary (hashed buckets can collide)
+    legacy_shared, vector_shared = legacy_score(tags, users), vector_score(tags, users)
+    vocabulary = set(VOCABULARY)
+    agree = sum(set(l) & vocabulary == set(v) for l, v in zip(legacy_shared, vector_shared))
+    print(f"{args.candidates} candidates, {len(tags)} viewer tags, {VECTOR_BYTES} bytes/vector, "
+          f"{agree / args.candidates:.1%} identical shared-tag sets")
+
+    legacy = min(timeit.repeat(lambda: legacy_score(tags, users), number=1, repeat=ROUNDS))
+    vector = min(timeit.repeat(lambda: vector_score(tags, users), number=1, repeat=ROUNDS))
+    print(f"ProfileSignature + sets : {legacy * 1000:8.2f} ms")
+    print(f"signature vectors       : {vector * 1000:8.2f} ms")
+    print(f"speedup                 : {legacy / vector:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Tag index lookups over popular tags: counting every posting list (the unbounded
+union) vs. TagIndex.top_k, which switches to a bounded best-score-first walk once
+the lists exceed SCAN_LIMIT entries. Reports p50/p99 per lookup and how much of
+the exact top k the bounded lookup returns, and checks that an index loaded back
+from a snapshot (a warm start) answers the same. Runs in memory.
+
+Run from the `thebox` directory:
+    python -m benchmarks.bench_tag_index [--users 1000000] [--queries 200] [--top 200]
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from routers.automations.recommendations.candidate_pools import SHARED_TAG_WEIGHT
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+from routers.automations.recommendations.tag_index import SCAN_LIMIT, WALK_LIMIT, TagIndex, index_entry
+
+CATEGORIES = [c.casefold() for c in CATEGORY_KEYWORDS]
+VOCABULARY = [kw.casefold() for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+# Popular tags are much more common than the long tail
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_user(rng: random.Random, i: int) -> dict:
+    if rng.random() < 0.1:
+        # Signed up without interests or a bio: in the index, but in no posting list
+        return {"user_id": f"bench-{i}", "profile_signature": {"profile_score": rng.randint(25, 200)}}
+    return {
+        "user_id": f"bench-{i}",
+        "profile_signature": {
+            "interests": rng.choices(VOCABULARY, TAG_WEIGHTS, k=rng.randint(2, 6)),
+            "bio_tags": rng.choices(VOCABULARY, TAG_WEIGHTS, k=rng.randint(0, 4)),
+            "behavioral_tags": rng.sample(CATEGORIES, rng.randint(0, 2)),
+            "category": rng.sample(CATEGORIES, rng.randint(1, 3)),
+            "profile_score": rng.randint(25, 200),
+        },
+    }
+
+
+def full_union(index: TagIndex, tags: list, k: int) -> list:
+    counts = Counter()
+    for tag in tags:
+        postings = index.postings.get(tag)
+        if postings:
+            counts.update(postings)
+    scores = index.scores
+    best = heapq.nlargest(k, counts.items(), key=lambda item: SHARED_TAG_WEIGHT * item[1] + scores[item[0]])
+    return [(SHARED_TAG_WEIGHT * count + scores[ordinal], index.user_ids[ordinal]) for ordinal, count in best]
+
+
+def timed(fn, queries) -> tuple:
+    results, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top", type=int, default=200, help="k, as find_matches asks for POOL_FETCH_SIZE")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    index = TagIndex()
+    started = time.perf_counter()
+    for i in range(args.users):
+        index.upsert(*index_entry(make_user(rng, i)))
+    index.by_score, index.resorted = index.score_order(), set()
+    print(f"{args.users:,} users indexed in {time.perf_counter() - started:.1f}s, "
+          f"SCAN_LIMIT {SCAN_LIMIT:,}, WALK_LIMIT {WALK_LIMIT:,}")
+
+    # Viewers with the most common tags hit the longest posting lists
+    queries = [
+        list(dict.fromkeys(rng.choices(VOCABULARY[:20], k=rng.randint(3, 8)) + rng.sample(CATEGORIES, 2)))
+        for _ in range(args.queries)
+    ]
+    entries = statistics.mean(sum(len(index.postings.get(t, ())) for t in q) for q in queries)
+    print(f"{entries:,.0f} posting entries per query on average")
+
+    exact, exact_p50, exact_p99 = timed(lambda q: full_union(index, q, args.top), queries)
+    bounded, p50, p99 = timed(lambda q: index.top_k(q, args.top, SHARED_TAG_WEIGHT), queries)
+    # Tie-aware: a result counts if its score reaches the exact k-th best
+    found = sum(
+        min(len(best), sum(score >= best[-1][0] for score, _, _ in result))
+        for best, result in zip(exact, bounded) if best
+    )
+    recall = found / sum(len(best) for best in exact)
+    print(f"full posting-list union : p50 {exact_p50:8.2f} ms   p99 {exact_p99:8.2f} ms")
+    print(f"top_k (bounded)         : p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   recall@{args.top} {recall:6.1%}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tag_index.snapshot")
+        TagIndex.write_snapshot(index.snapshot_payload(), path)
+        loaded = TagIndex.read_snapshot(path)
+    loaded.by_score, loaded.resorted = loaded.score_order(), set()
+    warm = [loaded.top_k(q, args.top, SHARED_TAG_WEIGHT) for q in queries]
+    assert warm == bounded, "index loaded from the snapshot answers differently"
+    print(f"snapshot round trip     : {len(loaded):,} users, same results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Wire format for values cached in Redis: one header byte, then the payload.
+
+    header = codec id | ZLIB_FLAG when the payload is zlib-compressed
+
+Values written before the header existed are plain JSON text. Their first byte is
+printable ASCII or JSON whitespace, which no header uses, so they still decode and
+the format can change without flushing Redis.
+"""
+from datetime import datetime
+import json
+import os
+import zlib
+
+import msgpack
+
+ZLIB_FLAG = 0x80
+COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", 1024))   # bytes; 0 disables compression
+COMPRESS_LEVEL     = int(os.getenv("CACHE_COMPRESS_LEVEL", 1))          # cheap levels already get most of the win
+CACHE_CODEC        = os.getenv("CACHE_CODEC", "msgpack")
+
+_DATETIME_EXT = 1
+
+
+def _msgpack_default(obj):
+    # Mongo hands back naive UTC datetimes; keep them round-trippable
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_DATETIME_EXT, obj.isoformat().encode())
+    raise TypeError(f"Cannot cache value of type {type(obj).__name__}")
+
+
+def _msgpack_ext(code, data):
+    if code == _DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=str).encode()
+
+
+def _msgpack_dumps(value) -> bytes:
+    return msgpack.packb(value, default=_msgpack_default)
+
+
+def _msgpack_loads(data: bytes):
+    return msgpack.unpackb(data, ext_hook=_msgpack_ext)
+
+
+# name -> (header id, dumps, loads). Ids are permanent: add new ones, never reuse.
+CODECS = {
+    "json":    (0x01, _json_dumps, json.loads),
+    "msgpack": (0x02, _msgpack_dumps, _msgpack_loads),
+}
+_LOADERS = {codec_id: loads for codec_id, _, loads in CODECS.values()}
+_LEGACY_WHITESPACE = (0x09, 0x0A, 0x0D)
+
+
+def encode(value, codec: str = CACHE_CODEC, threshold: int = COMPRESS_THRESHOLD) -> bytes:
+    codec_id, dumps, _ = CODECS[codec]
+    payload = dumps(value)
+    if threshold and len(payload) >= threshold:
+        compressed = zlib.compress(payload, COMPRESS_LEVEL)
+        if len(compressed) < len(payload):
+            return bytes((codec_id | ZLIB_FLAG,)) + compressed
+    return bytes((codec_id,)) + payload
+
+
+def decode(data: bytes):
+    """Inverse of `encode`; raises ValueError for formats this worker does not know."""
+    header = data[0]
+    if 0x20 <= header < 0x80 or header in _LEGACY_WHITESPACE:
+        return json.loads(data)  # pre-header JSON
+
+    loads = _LOADERS.get(header & ~ZLIB_FLAG)
+    if loads is None:
+        raise ValueError(f"Unknown cache format 0x{header:02x}")
+    payload = data[1:]
+    if header & ZLIB_FLAG:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt cache payload: {e}") from e
+    return loads(payload)
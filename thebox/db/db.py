@@ -3,15 +3,77 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from motor.motor_asyncio import AsyncIOMotorCollection
 from contextlib import asynccontextmanager
 from fastapi import Request
+import asyncio
+import os
 
+from db.mongo_monitoring import MONGO_LISTENERS
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
+MONGO_DB  = os.getenv("MONGO_DB", "userdetails")
+
+# Pool / timeout settings; unset ones keep the driver defaults
+MONGO_OPTIONS = {
+    "maxPoolSize":              "MONGO_MAX_POOL_SIZE",          # driver default 100
+    "minPoolSize":              "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS":            "MONGO_MAX_IDLE_TIME_MS",
+    "waitQueueTimeoutMS":       "MONGO_WAIT_QUEUE_TIMEOUT_MS",  # fail fast instead of queueing forever
+    "connectTimeoutMS":         "MONGO_CONNECT_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "socketTimeoutMS":          "MONGO_SOCKET_TIMEOUT_MS",
+}
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS")   # e.g. "zstd,zlib" (zstd needs the zstandard package)
+
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = {opt: int(os.environ[env]) for opt, env in MONGO_OPTIONS.items() if os.getenv(env)}
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(MONGO_URL, event_listeners=MONGO_LISTENERS, **options)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.mongodb_client = AsyncIOMotorClient("mongodb://localhost:27017/")
-    app.mongodb = app.mongodb_client["userdetails"]
-    
+    app.mongodb_client = create_mongo_client()
+    app.mongodb = app.mongodb_client[MONGO_DB]
+
+    # Indexes from db.indexes; VERIFY_QUERY_PLANS=1 also refuses to start on a COLLSCAN
+    from db.indexes import ensure_indexes, verify_query_plans
+    await ensure_indexes(app.mongodb)
+    if os.getenv("VERIFY_QUERY_PLANS"):
+        failures = await verify_query_plans(app.mongodb)
+        if failures:
+            raise RuntimeError(f"Query shapes without an index: {failures}")
+
+    # bcrypt cost factor calibrated against BCRYPT_TARGET_MS
+    from security.passwords import configure_password_hashing
+    await configure_password_hashing()
+
+    # Background workers: /interactions event consumer, profile score and view stats
+    # flushers, the listener that keeps this worker's local cache tier coherent,
+    # the trace exporter, the recommendation candidate pool rebuilder and this
+    # worker's in-memory tag index
+    from db.redis_client import run_cache_invalidation_listener
+    from monitoring.tracing import run_trace_exporter
+    from routers.automations.recommendations.candidate_pools import run_candidate_pool_rebuilder
+    from routers.automations.recommendations.interaction_queue import run_interaction_consumer
+    from routers.automations.recommendations.profile_scores import run_profile_score_flusher
+    from routers.automations.recommendations.tag_index import TAG_INDEX_ENABLED, run_tag_index
+    from routers.crud.view_stats import run_view_stats_flusher
+    background = [
+        asyncio.create_task(run_interaction_consumer(app.mongodb)),
+        asyncio.create_task(run_profile_score_flusher(app.mongodb)),
+        asyncio.create_task(run_view_stats_flusher(app.mongodb)),
+        asyncio.create_task(run_cache_invalidation_listener()),
+        asyncio.create_task(run_trace_exporter()),
+        asyncio.create_task(run_candidate_pool_rebuilder(app.mongodb)),
+    ]
+    if TAG_INDEX_ENABLED:
+        background.append(asyncio.create_task(run_tag_index(app.mongodb)))
+
     yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
     app.mongodb_client.close()
 
 def get_collection(request: Request, name: str) -> AsyncIOMotorCollection:
@@ -0,0 +1,122 @@
+"""
+Every index the app relies on, created idempotently at startup, plus the query
+shapes they exist for.
+
+Check mode runs `explain()` on each shape and fails if any would COLLSCAN:
+    python -m db.indexes --check [--mongo-url ...] [--db ...]
+"""
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+INDEXES = {
+    "users": [
+        # Unique: create_user relies on these instead of find-then-insert
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        # Explore fallback; tag / location candidates come from the Redis pools
+        IndexModel([("profile_signature.profile_score", DESCENDING)], name="sig_profile_score"),
+    ],
+    "stories": [
+        IndexModel([("stories.story_id", ASCENDING)], name="story_id"),
+        IndexModel([("user.user_id", ASCENDING)], name="owner_id"),
+    ],
+    "story_engagement": [
+        # Keyset pages newest first by (at, _id), see routers.crud.pagination
+        IndexModel([("story_id", ASCENDING), ("kind", ASCENDING), ("at", DESCENDING), ("_id", DESCENDING)],
+                   name="story_kind_at_id"),
+        IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+    ],
+    "user_views": [
+        IndexModel([("viewer_id", ASCENDING), ("target_id", ASCENDING)], name="viewer_target_unique", unique=True),
+    ],
+    "viewer_logs": [
+        IndexModel([("target_id", ASCENDING)], name="target_id_unique", unique=True),
+    ],
+    "interactions": [
+        IndexModel([("viewer_id", ASCENDING), ("target_id", ASCENDING)], name="viewer_target"),
+    ],
+}
+
+# (collection, filter, sort) for every query the app runs outside _id lookups
+QUERY_SHAPES = [
+    ("users", {"email": "a@example.com"}, None),
+    ("users", {"username": "someone"}, None),
+    ("users", {"$or": [{"email": "a@example.com"}, {"username": "someone"}]}, None),
+    ("users", {"user_id": "u1"}, None),
+    ("users", {"user_id": {"$in": ["u1", "u2"]}}, None),
+    ("users", {"profile_signature": {"$exists": True}}, [("profile_signature.profile_score", DESCENDING)]),
+    ("stories", {"user.user_id": "u1"}, None),
+    ("stories", {"stories.story_id": "s1"}, None),
+    ("story_engagement", {"story_id": "s1", "kind": "views"}, [("at", DESCENDING), ("_id", DESCENDING)]),
+    ("story_engagement", {"story_id": "s1"}, None),
+    ("story_engagement", {"owner_id": "u1"}, None),
+    ("user_views", {"viewer_id": "u1", "target_id": "u2"}, None),
+    ("user_views", {"viewer_id": "u1"}, None),
+    ("viewer_logs", {"target_id": "u2"}, None),
+    ("interactions", {"viewer_id": "u1", "target_id": {"$in": ["u2", "u3"]}}, None),
+]
+
+
+async def ensure_indexes(db):
+    """Create any missing index; existing ones with the same spec are left alone."""
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except Exception as e:
+            # e.g. duplicates already stored under a unique key: fix the data, don't run without it
+            print(f"❌ Could not create indexes on {collection}: {e}")
+            raise
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+async def verify_query_plans(db) -> list:
+    """Query shapes whose winning plan contains a COLLSCAN, as readable strings."""
+    failures = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _stages(plan):
+            failures.append(f"{collection}.find({query}){f'.sort({sort})' if sort else ''}")
+    return failures
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="userdetails")
+    parser.add_argument("--check", action="store_true", help="explain() every known query shape after creating indexes")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        db = client[args.db]
+        await ensure_indexes(db)
+        print(f"✅ Indexes ensured on {len(INDEXES)} collections")
+        if args.check:
+            failures = await verify_query_plans(db)
+            for failure in failures:
+                print(f"❌ COLLSCAN: {failure}")
+            if failures:
+                sys.exit(1)
+            print(f"✅ {len(QUERY_SHAPES)} query shapes use an index")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
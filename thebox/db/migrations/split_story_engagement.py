@@ -0,0 +1,97 @@
+"""
+Move embedded story engagement (views/reactions/reposts/shares arrays inside
+`stories.stories[]`) into the append-only `story_engagement` collection and
+replace the arrays with pre-aggregated `counts`.
+
+Streams the `stories` collection one user document at a time, so it runs in
+constant memory. Safe to re-run: engagement records get deterministic _ids
+and already-migrated stories are skipped. Each user document is rewritten
+whole, so run it while story writes are paused.
+
+Run from the `thebox` directory:
+    python -m db.migrations.split_story_engagement [--dry-run]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+LEGACY_ARRAYS = ("views", "reactions", "reposts", "shares")
+TIME_FIELDS = {"views": "viewed_at", "reactions": "reacted_at", "reposts": "reposted_at", "shares": "shared_at"}
+BATCH_SIZE = 100
+
+
+def split_story(owner_id: str, story: dict):
+    """Return (story without engagement arrays, engagement records) for one embedded story."""
+    records = []
+    counts = dict(story.get("counts") or {})
+    for kind in LEGACY_ARRAYS:
+        entries = story.get(kind) or []
+        counts[kind] = counts.get(kind, 0) + len(entries)
+        for i, entry in enumerate(entries):
+            records.append({
+                "_id": f"{story['story_id']}:{kind}:{i}",
+                "story_id": story["story_id"],
+                "owner_id": owner_id,
+                "kind": kind,
+                "at": entry.get(TIME_FIELDS[kind]) or datetime.utcnow(),
+                **entry
+            })
+    slim = {k: v for k, v in story.items() if k not in LEGACY_ARRAYS}
+    slim["counts"] = counts
+    return slim, records
+
+
+async def _insert_records(db, records):
+    if not records:
+        return
+    try:
+        await db.story_engagement.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate _ids mean the record was copied by an earlier, interrupted run
+        if any(err["code"] != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def migrate(db, dry_run: bool = False):
+    legacy = {"$or": [{f"stories.{kind}": {"$exists": True}} for kind in LEGACY_ARRAYS]}
+    docs = records_total = 0
+
+    async for doc in db.stories.find(legacy, batch_size=BATCH_SIZE):
+        slim_stories, records = [], []
+        for story in doc.get("stories", []):
+            slim, story_records = split_story(doc["_id"], story)
+            slim_stories.append(slim)
+            records.extend(story_records)
+
+        if not dry_run:
+            # Records first: if we stop halfway, the arrays are still there to retry from
+            await _insert_records(db, records)
+            await db.stories.update_one({"_id": doc["_id"]}, {"$set": {"stories": slim_stories}})
+
+        docs += 1
+        records_total += len(records)
+        if docs % 1000 == 0:
+            print(f"… {docs} story documents, {records_total} engagement records")
+
+    print(f"✅ {'Would migrate' if dry_run else 'Migrated'} {docs} story documents, {records_total} engagement records")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="userdetails")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        await migrate(client[args.db], dry_run=args.dry_run)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -54,11 +54,21 @@ class TextStoryInput(BaseModel):
     caption: Optional[str] = Field(None, max_length=300)
     mentions: List[str] = Field(default_factory=list)
 
-# Full story saved in DB
+# Pre-aggregated engagement counters kept on the story itself
+class StoryCounts(BaseModel):
+    views: int = 0
+    reactions: int = 0
+    reposts: int = 0
+    shares: int = 0
+
+# Full story saved in DB.
+# Engagement records live in the append-only `story_engagement` collection;
+# the lists below are only filled when a caller loads them explicitly.
 class Story(BaseModel):
     story_id: str = Field(default_factory=lambda: str(uuid4()))
     user: UserPreview
     details: StoryInput
+    counts: StoryCounts = Field(default_factory=StoryCounts)
     views: List[View] = Field(default_factory=list)
     reactions: List[Reaction] = Field(default_factory=list)
     reposts: List[Repost] = Field(default_factory=list)
@@ -0,0 +1,135 @@
+"""
+pymongo event listeners feeding the app's metrics: per collection/command latency,
+connection checkout waits and pool exhaustion. Register with
+`AsyncIOMotorClient(..., event_listeners=MONGO_LISTENERS)`.
+
+Motor runs pymongo in executor threads, so the callbacks below run off the event loop.
+"""
+from collections import Counter
+import threading
+import time
+
+from pymongo import monitoring
+
+from monitoring.metrics import HistogramFamily, LockedHistogram, render_histograms, render_samples
+from monitoring.tracing import start_child
+
+# Commands whose first field is not the collection name
+_COLLECTION_FIELDS = {"getMore": "collection"}
+
+command_latency = HistogramFamily(("collection", "command"), histogram=LockedHistogram)
+command_failures: Counter = Counter()            # (collection, command) -> failed commands
+checkout_wait = HistogramFamily(("address",), histogram=LockedHistogram)
+pool_counters: Counter = Counter()               # "checkouts", "exhausted", "connections_created", ...
+pool_checked_out: Counter = Counter()            # address -> connections currently checked out
+_counter_lock = threading.Lock()
+
+
+def _collection(event) -> str:
+    field = _COLLECTION_FIELDS.get(event.command_name, event.command_name)
+    value = event.command.get(field)
+    return value if isinstance(value, str) else "-"
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    def __init__(self):
+        self._inflight = {}   # (connection_id, request_id) -> (collection, tracing span or None)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = _collection(event)
+        # Runs in a copy of the calling task's context, so this nests under the request's span
+        span = start_child(f"mongo {event.command_name}", collection=collection)
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (collection, span)
+
+    def _finish(self, event) -> tuple:
+        with self._lock:
+            collection, span = self._inflight.pop((event.connection_id, event.request_id), ("-", None))
+        duration = event.duration_micros / 1e6
+        if span is not None:
+            span.finish(duration)
+        labels = (collection, event.command_name)
+        command_latency.labels(*labels).observe(duration)
+        return labels
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        with _counter_lock:
+            command_failures[labels] += 1
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        # Checkout is synchronous in the calling thread, so started/finished pair up per thread
+        self._local = threading.local()
+
+    def _count(self, name: str, address=None, checked_out: int = 0):
+        with _counter_lock:
+            pool_counters[name] += 1
+            if checked_out:
+                pool_checked_out[address] += checked_out
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            checkout_wait.labels(f"{event.address[0]}:{event.address[1]}").observe(time.perf_counter() - started)
+            self._local.started = None
+
+    def connection_checked_out(self, event):
+        self._waited(event)
+        self._count("checkouts", event.address, checked_out=1)
+
+    def connection_check_out_failed(self, event):
+        self._waited(event)
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            # waitQueueTimeoutMS hit: every connection was busy
+            self._count("exhausted")
+        else:
+            self._count("checkout_failures")
+
+    def connection_checked_in(self, event):
+        with _counter_lock:
+            pool_checked_out[event.address] -= 1
+
+    def connection_created(self, event):
+        self._count("connections_created")
+
+    def connection_closed(self, event):
+        self._count("connections_closed")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+MONGO_LISTENERS = [CommandLatencyListener(), PoolMetricsListener()]
+
+
+def render_mongo_metrics(lines: list):
+    with _counter_lock:
+        failures = dict(command_failures)
+        pool = dict(pool_counters)
+        checked_out = {f"{a[0]}:{a[1]}": n for a, n in pool_checked_out.items()}
+    render_histograms(lines, "mongodb_command_duration_seconds", "Mongo command latency by collection and command.", command_latency)
+    render_samples(lines, "mongodb_command_failures_total", "counter", "Failed Mongo commands.", ("collection", "command"), failures)
+    render_histograms(lines, "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", checkout_wait)
+    render_samples(lines, "mongodb_pool_events_total", "counter", "Connection pool events (checkouts, exhausted, ...).", ("event",), pool)
+    render_samples(lines, "mongodb_pool_checked_out", "gauge", "Connections currently checked out.", ("address",), checked_out)
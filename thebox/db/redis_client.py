@@ -1,24 +1,323 @@
 import redis.asyncio as redis
+import asyncio
 import json
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from db.cache_codec import decode, encode
+from monitoring.tracing import span
+from security.token_cache import TOKEN_CACHE
+
+
+class TracedRedis(redis.Redis):
+    """redis.Redis that adds a tracing span per command and per pipeline execute."""
+
+    async def execute_command(self, *args, **options):
+        with span(f"redis {args[0]}", key=args[1] if len(args) > 1 else None):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        async def traced_execute(raise_on_error: bool = True):
+            with span("redis PIPELINE", commands=" ".join(str(c[0][0]) for c in pipe.command_stack)):
+                return await execute(raise_on_error)
+
+        pipe.execute = traced_execute
+        return pipe
+
 
 # Async Redis client
-redis_client = redis.Redis(host='127.0.0.1', port=6379, db=0, decode_responses=True)
+redis_client = TracedRedis(host='127.0.0.1', port=6379, db=0, decode_responses=True)
+# Same server without response decoding: cached values are binary (see db.cache_codec)
+redis_bytes = TracedRedis(host='127.0.0.1', port=6379, db=0)
 
 
 # Set cache with TTL
 PROFILE_CACHE_TTL = 60 * 60 * 24 * 30   # 2 months
 STORY_CACHE_TTL = 60 * 60 * 24          # 24 hours
 
+# Per-worker in-memory tier in front of Redis. Entries live at most LOCAL_CACHE_TTL
+# so a missed invalidation can only serve stale data for that long.
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", 10_000))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", 30))   # secs
+INVALIDATION_CHANNEL = "cache:invalidate"
+REVOKED_TOKEN_KEY = "auth:revoked:{}"      # token digest, kept until the token expires
+WORKER_ID = str(uuid4())
+
+# Stampede protection for get_or_load
+LOAD_LOCK_TTL_MS = 5000      # cross-worker loader lock
+LOAD_LOCK_WAIT = 2.0         # secs a worker waits for another worker's load before loading itself
+LOAD_LOCK_POLL = 0.05        # secs
+REFRESH_AHEAD_BETA = 1.0     # >1 refreshes earlier, <1 later (XFetch)
+
+
+class LocalCache:
+    """LRU of decoded cache values with a per-entry deadline. Values are shared: treat them as read-only."""
+
+    def __init__(self, maxsize: int = LOCAL_CACHE_SIZE, ttl: int = LOCAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def get_entry(self, key: str):
+        """(value, monotonic time the Redis copy expires) or (None, None)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        value, deadline, expires_at = entry
+        if deadline <= time.monotonic():
+            del self._entries[key]
+            return None, None
+        self._entries.move_to_end(key)
+        return value, expires_at
+
+    def get(self, key: str):
+        return self.get_entry(key)[0]
+
+    def set(self, key: str, value, ttl: int):
+        now = time.monotonic()
+        self._entries[key] = (value, now + min(ttl, self.ttl), now + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache()
+# Plain ints: only touched from the event loop. Exported at /metrics.
+cache_counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "loads": 0, "decode_errors": 0}
+
+
+async def _broadcast_invalidation(*keys: str):
+    # Other workers drop their local copies; our own messages are ignored on receipt
+    await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"origin": WORKER_ID, "keys": keys}))
+
+
+async def record_token_revocation(token_key: str, exp: float):
+    # Stored for workers that verify the token later; published for the ones that may have it cached
+    async with redis_client.pipeline(transaction=False) as pipe:
+        ttl = math.ceil(exp - time.time())
+        if ttl > 0:
+            pipe.set(REVOKED_TOKEN_KEY.format(token_key), 1, ex=ttl)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps(
+            {"origin": WORKER_ID, "keys": [], "revoked_tokens": [[token_key, exp]]}
+        ))
+        await pipe.execute()
+
+
+async def is_token_revoked(token_key: str) -> bool:
+    return bool(await redis_client.exists(REVOKED_TOKEN_KEY.format(token_key)))
+
+
 async def set_cache(key: str, data: dict, ttl: int = PROFILE_CACHE_TTL):
-    await redis_client.set(key, json.dumps(data), ex=ttl)
+    await redis_bytes.set(key, encode(data), ex=ttl)
+    local_cache.set(key, data, ttl)
+    await _broadcast_invalidation(key)
+
+
+
+async def _get_with_expiry(key: str, use_local: bool = True):
+    """(value, monotonic expiry of the Redis copy) from the local tier, then Redis."""
+    if use_local:
+        value, expires_at = local_cache.get_entry(key)
+        if value is not None:
+            cache_counters["local_hits"] += 1
+            return value, expires_at
 
+    async with redis_bytes.pipeline(transaction=False) as pipe:
+        pipe.get(key)
+        pipe.ttl(key)
+        data, ttl = await pipe.execute()
+    value = None
+    if data:
+        try:
+            value = decode(data)
+        except ValueError:
+            # Written by a newer format (or corrupt): reload it like a miss
+            cache_counters["decode_errors"] += 1
+    if value is None:
+        cache_counters["misses"] += 1
+        return None, None
+
+    cache_counters["redis_hits"] += 1
+    ttl = ttl if ttl > 0 else LOCAL_CACHE_TTL
+    local_cache.set(key, value, ttl)
+    return value, time.monotonic() + ttl
 
 
 # Get cache
 async def get_cache(key: str):
-    data = await redis_client.get(key)
-    return json.loads(data) if data else None
+    return (await _get_with_expiry(key))[0]
+
+async def get_cache_many(keys: list) -> list:
+    """
+    Values for `keys` in order (None for misses): the local tier, then one round trip
+    (MGET plus the TTLs) for the rest. Redis hits are copied into the local tier.
+    """
+    values = [local_cache.get(key) for key in keys]
+    remote = [i for i, value in enumerate(values) if value is None]
+    cache_counters["local_hits"] += len(keys) - len(remote)
+    if not remote:
+        return values
+
+    async with redis_bytes.pipeline(transaction=False) as pipe:
+        pipe.mget([keys[i] for i in remote])
+        for i in remote:
+            pipe.ttl(keys[i])
+        found, *ttls = await pipe.execute()
+    for i, data, ttl in zip(remote, found, ttls):
+        if data:
+            try:
+                values[i] = decode(data)
+            except ValueError:
+                cache_counters["decode_errors"] += 1
+        if values[i] is None:
+            cache_counters["misses"] += 1
+            continue
+        cache_counters["redis_hits"] += 1
+        local_cache.set(keys[i], values[i], ttl if ttl > 0 else LOCAL_CACHE_TTL)
+    return values
+
+
+async def set_cache_many(items: dict, ttl: int = PROFILE_CACHE_TTL):
+    """set_cache for several keys in one pipeline round trip."""
+    if not items:
+        return
+    async with redis_bytes.pipeline(transaction=False) as pipe:
+        for key, data in items.items():
+            pipe.set(key, encode(data), ex=ttl)
+        await pipe.execute()
+    for key, data in items.items():
+        local_cache.set(key, data, ttl)
+    await _broadcast_invalidation(*items)
 
 # Delete cache
-async def delete_cache(key: str):
-    await redis_client.delete(key)
+async def delete_cache(*keys: str):
+    if not keys:
+        return
+    await redis_client.delete(*keys)
+    local_cache.delete(*keys)
+    await _broadcast_invalidation(*keys)
+
+
+# ------------------ Single-flight loading ------------------ #
+
+_inflight: dict = {}       # key -> asyncio.Task shared by concurrent misses in this worker
+_load_seconds: dict = {}   # key prefix -> recent loader duration, for refresh-ahead
+
+
+def _prefix(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def _should_refresh_early(key: str, expires_at: float) -> bool:
+    # XFetch: refresh with a probability that rises as expiry approaches,
+    # scaled by how long this kind of key takes to load
+    delta = _load_seconds.get(_prefix(key), 0.1)
+    return time.monotonic() - delta * REFRESH_AHEAD_BETA * math.log(random.random() or 1e-12) >= expires_at
+
+
+async def _load_with_lock(key: str, loader, ttl: int, refresh: bool):
+    lock_key = f"lock:{key}"
+    token = str(uuid4())
+    locked = await redis_client.set(lock_key, token, nx=True, px=LOAD_LOCK_TTL_MS)
+    if not locked:
+        if refresh:
+            return None  # another worker is already refreshing it
+        # Another worker is loading this key; wait for it to land in Redis
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LOAD_LOCK_WAIT
+        while loop.time() < deadline:
+            await asyncio.sleep(LOAD_LOCK_POLL)
+            value, _ = await _get_with_expiry(key, use_local=False)
+            if value is not None:
+                return value
+
+    started = time.monotonic()
+    cache_counters["loads"] += 1
+    try:
+        value = await loader()
+        if value is not None:
+            await set_cache(key, value, ttl)
+    finally:
+        if locked and await redis_client.get(lock_key) == token:
+            await redis_client.delete(lock_key)
+    _load_seconds[_prefix(key)] = time.monotonic() - started
+    return value
+
+
+def _single_flight(key: str, loader, ttl: int, refresh: bool = False) -> asyncio.Task:
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_with_lock(key, loader, ttl, refresh))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: (_inflight.pop(key, None), t.cancelled() or t.exception()))
+    return task
+
+
+async def get_or_load(key: str, loader, ttl: int = PROFILE_CACHE_TTL):
+    """
+    Cached value for `key`, or the result of `await loader()` (cached for `ttl`).
+
+    Concurrent misses in this worker share one loader call, a short Redis lock
+    makes other workers wait for that load instead of hitting Mongo too, and
+    keys close to expiry are refreshed in the background ahead of time.
+    """
+    value, expires_at = await _get_with_expiry(key)
+    if value is not None:
+        if _should_refresh_early(key, expires_at) and key not in _inflight:
+            _single_flight(key, loader, ttl, refresh=True)
+        return value
+    # shield: a cancelled request must not cancel the load other requests wait on
+    value = await asyncio.shield(_single_flight(key, loader, ttl))
+    if value is None:
+        # We joined a background refresh that yielded to another worker
+        value = await loader()
+    return value
+
+
+async def run_cache_invalidation_listener():
+    """
+    Background task: apply other workers' invalidations to the local tier (and
+    their token revocations to TOKEN_CACHE).
+    If the subscription drops, messages may have been missed, so the local tier and
+    the verified tokens are cleared.
+    """
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                payload = json.loads(message["data"])
+                if payload["origin"] != WORKER_ID:
+                    local_cache.delete(*payload["keys"])
+                    for token_key, exp in payload.get("revoked_tokens", []):
+                        TOKEN_CACHE.revoke(token_key, exp)
+                    cache_counters["invalidations"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Cache invalidation listener error: {e}")
+            local_cache.clear()
+            # Revocations may have been missed too: re-check tokens against Redis
+            TOKEN_CACHE.clear_verified()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
@@ -3,14 +3,18 @@ from db.db import lifespan
 from routers.router import router as user_router
 from routers.router import test_router 
 from routers.automations.recommendations.interaction import router as interactions_router 
-
-from fastapi.staticfiles import StaticFiles
+from routers.media import router as media_router
+from routers.metrics import router as metrics_router
+from monitoring.middleware import MetricsMiddleware, TracingMiddleware
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(user_router)
 app.include_router(interactions_router)
-app.mount("/media", StaticFiles(directory="media"), name="media")
+app.include_router(media_router)  # range/ETag/304-aware, replaces StaticFiles(directory="media")
+app.include_router(metrics_router)  # Prometheus text at /metrics
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)  # span per request; slow ones logged (SLOW_REQUEST_MS)
 
 
 
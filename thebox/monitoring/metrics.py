@@ -0,0 +1,143 @@
+"""
+Per-worker metrics and their Prometheus text rendering (served at /metrics).
+
+Everything here is plain in-process state. Metrics touched only from the event loop
+need no locks (one thread, no await inside an update); the Locked* variants exist for
+pymongo listeners, which Motor calls from executor threads. With several workers, each
+one serves its own numbers: scrape every worker or sum them.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+from typing import Iterable, List, Tuple
+
+# Upper bounds in seconds, Prometheus-style; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, cumulative buckets computed on read. Event-loop only."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def _read(self):
+        return list(self.counts), self.count, self.sum
+
+    def snapshot(self) -> dict:
+        counts, count, total = self._read()
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative[_le(bound)] = running
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class LockedHistogram(Histogram):
+    """Histogram safe to observe from other threads."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        super().__init__(buckets)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            super().observe(value)
+
+    def _read(self):
+        with self._lock:
+            return super()._read()
+
+
+class HistogramFamily:
+    """Histograms keyed by a tuple of label values, e.g. (method, route)."""
+
+    def __init__(self, label_names, buckets=LATENCY_BUCKETS, histogram=Histogram):
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self._histogram = histogram
+        self._children = {}
+        self._lock = threading.Lock() if histogram is LockedHistogram else None
+
+    def labels(self, *values) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            if self._lock:
+                with self._lock:
+                    child = self._children.setdefault(values, self._histogram(self.buckets))
+            else:
+                child = self._children[values] = self._histogram(self.buckets)
+        return child
+
+    def items(self):
+        return list(self._children.items())
+
+    def snapshot(self) -> list:
+        return [{**dict(zip(self.label_names, values)), **hist.snapshot()} for values, hist in self.items()]
+
+
+# ------------------ HTTP (fed by monitoring.middleware) ------------------ #
+
+http_latency = HistogramFamily(("method", "route"))
+http_responses = defaultdict(int)      # (method, route, status) -> responses
+http_in_flight = defaultdict(int)      # method -> requests being handled right now
+
+
+# ------------------ Prometheus text format ------------------ #
+
+def _le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]]) -> str:
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return f"{{{body}}}" if body else ""
+
+
+def _header(lines: List[str], name: str, kind: str, help_text: str):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def render_histograms(lines: List[str], name: str, help_text: str, family: HistogramFamily):
+    _header(lines, name, "histogram", help_text)
+    for values, hist in family.items():
+        base = list(zip(family.label_names, values))
+        snap = hist.snapshot()
+        for le, n in snap["buckets"].items():
+            lines.append(f"{name}_bucket{_labels(base + [('le', le)])} {n}")
+        lines.append(f"{name}_sum{_labels(base)} {snap['sum']}")
+        lines.append(f"{name}_count{_labels(base)} {snap['count']}")
+
+
+def render_samples(lines: List[str], name: str, kind: str, help_text: str, label_names, samples: dict):
+    """`samples` maps a label-value tuple (or a single value for one label) to a number."""
+    _header(lines, name, kind, help_text)
+    for values, n in list(samples.items()):
+        values = values if isinstance(values, tuple) else (values,)
+        lines.append(f"{name}{_labels(zip(label_names, values))} {n}")
+
+
+def render_value(lines: List[str], name: str, kind: str, help_text: str, value):
+    _header(lines, name, kind, help_text)
+    lines.append(f"{name} {value}")
+
+
+def render_http(lines: List[str]):
+    render_histograms(lines, "http_request_duration_seconds", "Request latency by route template.", http_latency)
+    render_samples(lines, "http_responses_total", "counter", "Responses by route and status code.",
+                   ("method", "route", "status"), http_responses)
+    render_samples(lines, "http_requests_in_flight", "gauge", "Requests currently being handled.",
+                   ("method",), http_in_flight)
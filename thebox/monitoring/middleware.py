@@ -0,0 +1,70 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from monitoring.metrics import http_in_flight, http_latency, http_responses
+from monitoring.tracing import request_trace
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: per-route latency histogram, response counts by status and
+    in-flight requests. Routes are labelled by their template (`/users/stories/{story_id}`),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight[method] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight[method] -= 1
+            # The router stores the matched route on the (shared) scope
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            http_latency.labels(method, route).observe(elapsed)
+            http_responses[(method, route, status)] += 1
+
+
+class TracingMiddleware:
+    """Opens the root span for each HTTP request (see monitoring.tracing)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with request_trace(f"{scope['method']} {scope['path']}") as root:
+            async def send_with_status(message: Message):
+                if message["type"] == "http.response.start":
+                    root.attrs["status"] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.attrs["path"] = scope["path"]
+                    root.name = f"{scope['method']} {route}"
@@ -0,0 +1,173 @@
+"""
+Lightweight request tracing on contextvars.
+
+TracingMiddleware opens a root span per request; `span()` opens children under
+whatever span is current. Mongo commands (db.mongo_monitoring) and Redis calls
+(db.redis_client.TracedRedis) add their own child spans. Outside a request there
+is no current span and nothing is recorded.
+
+Every request keeps its span tree in memory until it finishes. A sampled fraction
+of traces, plus every request slower than SLOW_REQUEST_MS, is appended as one JSON
+line to TRACE_FILE by `run_trace_exporter`. Slow requests also have their tree printed.
+"""
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from uuid import uuid4
+import asyncio
+import json
+import os
+import random
+import time
+
+TRACE_SAMPLE_RATE    = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))   # fraction of requests exported
+TRACE_FILE           = os.getenv("TRACE_FILE", "traces.jsonl")
+SLOW_REQUEST_MS      = float(os.getenv("SLOW_REQUEST_MS", 1000))
+TRACE_FLUSH_INTERVAL = 1.0          # secs
+MAX_SPANS_PER_TRACE  = 1000         # keeps a runaway loop from growing one trace without bound
+MAX_PENDING_TRACES   = 10_000       # exporter backlog; oldest are dropped first
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "trace")
+
+    def __init__(self, name: str, trace: "Trace", attrs: Optional[dict] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List["Span"] = []
+        self.trace = trace
+
+    def finish(self, duration: Optional[float] = None):
+        self.end = self.start + duration if duration is not None else time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            **({"attrs": self.attrs} if self.attrs else {}),
+            **({"children": [c.to_dict(origin) for c in self.children]} if self.children else {}),
+        }
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid4().hex
+        self.started_at = time.time()
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.span_count = 1
+        self.dropped = 0
+        self.root = Span(name, self, attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "dropped_spans": self.dropped,
+            **self.root.to_dict(self.root.start),
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_pending: deque = deque(maxlen=MAX_PENDING_TRACES)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_child(name: str, **attrs) -> Optional[Span]:
+    """
+    New child of the current span, or None outside a trace. The caller finishes it.
+    Safe from Motor's executor threads: they run in a copy of the caller's context.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    if trace.span_count >= MAX_SPANS_PER_TRACE:
+        trace.dropped += 1
+        return None
+    trace.span_count += 1
+    child = Span(name, trace, attrs)
+    parent.children.append(child)
+    return child
+
+
+@contextmanager
+def span(name: str, **attrs):
+    child = start_child(name, **attrs)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+@contextmanager
+def request_trace(name: str, **attrs):
+    trace = Trace(name, attrs)
+    token = _current_span.set(trace.root)
+    try:
+        yield trace.root
+    finally:
+        trace.root.finish()
+        _current_span.reset(token)
+        _finish_trace(trace)
+
+
+def format_tree(span: Span, depth: int = 0) -> str:
+    attrs = " ".join(f"{k}={v}" for k, v in span.attrs.items())
+    lines = [f"{'  ' * depth}{span.duration_ms:9.2f} ms  {span.name}{'  ' + attrs if attrs else ''}"]
+    for child in span.children:
+        lines.append(format_tree(child, depth + 1))
+    return "\n".join(lines)
+
+
+def _finish_trace(trace: Trace):
+    slow = trace.root.duration_ms >= SLOW_REQUEST_MS
+    if slow:
+        print(f"🐢 Slow request {trace.root.name} ({trace.root.duration_ms:.0f} ms, trace {trace.trace_id})\n{format_tree(trace.root)}")
+    if slow or trace.sampled:
+        _pending.append(trace)
+
+
+def _drain() -> List[str]:
+    lines = []
+    while _pending:
+        lines.append(json.dumps(_pending.popleft().to_dict(), default=str) + "\n")
+    return lines
+
+
+def _append_lines(lines: List[str]):
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+async def run_trace_exporter():
+    """Background task: append finished sampled/slow traces to TRACE_FILE."""
+    while True:
+        try:
+            await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+            lines = _drain()
+            if lines:
+                await asyncio.to_thread(_append_lines, lines)
+        except asyncio.CancelledError:
+            # Shutting down: write what is left before exiting
+            lines = _drain()
+            if lines:
+                _append_lines(lines)
+            raise
+        except Exception as e:
+            print(f"❌ Trace export error: {e}")
@@ -0,0 +1,302 @@
+"""
+Precomputed recommendation candidate pools: Redis sorted sets of user ids scored
+by profile_score.
+
+    pool:tag:{tag}        users with `tag` in interests / bio_tags / behavioral_tags
+    pool:cat:{category}   users in an umbrella category
+    pool:loc:{location}   users by location
+    pool:all              everyone with a signature
+    pool:lsh:{band}:{h}   users whose MinHash sketch falls in that LSH band bucket (see minhash);
+                          all scored 0, so similar users are not cut by profile_score
+    pool:user:{user_id}   (set) the pool keys a user is currently in, for removals
+
+Pools are kept current incrementally (signup, profile edits, learned behavioral
+tags, profile score flushes) and rebuilt from Mongo periodically, which also
+repairs anything an incremental update missed and re-encodes outdated signature
+vectors (see signature_vectors).
+
+Run a rebuild by hand from the `thebox` directory:
+    python -m routers.automations.recommendations.candidate_pools
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+from uuid import uuid4
+import asyncio
+
+from db.redis_client import redis_client
+from routers.automations.recommendations.profile_scores import DEFAULT_PROFILE_SCORE
+from routers.automations.recommendations.minhash import MINHASH_FIELD, band_keys, sketch
+from routers.automations.recommendations.signature_vectors import VECTOR_FIELD, signature_tags, stale_vector_ops
+from routers.automations.recommendations.tag_index import queue_index_changes, queue_index_removal
+
+TAG_POOL_KEY      = "pool:tag:{}"
+CATEGORY_POOL_KEY = "pool:cat:{}"
+LOCATION_POOL_KEY = "pool:loc:{}"
+ALL_POOL_KEY      = "pool:all"
+LSH_POOL_KEY      = "pool:lsh:{}"
+USER_POOLS_KEY    = "pool:user:{}"
+
+SHARED_TAG_WEIGHT      = 5        # same weighting the recommender used in Python
+POOL_FETCH_SIZE        = 200      # top members read per matching pool
+LSH_BUCKET_FETCH       = 50       # top members read per LSH bucket
+SIMILAR_CANDIDATES     = 200      # shortlist by shared buckets, re-ranked by Jaccard
+REBUILD_BATCH          = 1000
+REBUILD_INTERVAL       = 6 * 3600  # secs
+REBUILD_LOCK_KEY       = "pool:rebuild_lock"
+REBUILD_LOCK_TTL       = 3600      # secs
+REBUILD_SEEN_KEY       = "pool:rebuild_seen:{}"   # users a rebuild found in Mongo
+POOL_USER_PROJECTION   = {"user_id": 1, "location": 1, "profile_signature": 1,
+                          f"{VECTOR_FIELD}.version": 1, f"{MINHASH_FIELD}.version": 1}
+
+
+# Per user, atomically: leave the pools it is no longer in, join (or re-score in) the
+# ones it belongs in and record that membership. KEYS[1] is the membership set,
+# KEYS[2..] the pools; ARGV[1] is the user id, ARGV[2..] its score in each pool.
+SYNC_POOLS_SCRIPT = redis_client.register_script("""
+local uid = ARGV[1]
+local wanted = {}
+for i = 2, #KEYS do wanted[KEYS[i]] = true end
+for _, key in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if not wanted[key] then redis.call('ZREM', key, uid) end
+end
+redis.call('DEL', KEYS[1])
+for i = 2, #KEYS do
+    redis.call('ZADD', KEYS[i], ARGV[i], uid)
+    redis.call('SADD', KEYS[1], KEYS[i])
+end
+""")
+
+
+def pool_keys(user: dict) -> Tuple[set, float]:
+    """(pool keys this user belongs in, their score); no keys without a signature."""
+    signature = user.get("profile_signature")
+    if not signature:
+        return set(), 0
+    keys = {ALL_POOL_KEY}
+    for source in ("interests", "bio_tags", "behavioral_tags"):
+        keys.update(TAG_POOL_KEY.format(t.casefold()) for t in signature.get(source) or [])
+    keys.update(CATEGORY_POOL_KEY.format(c.casefold()) for c in signature.get("category") or [])
+    location = signature.get("location") or user.get("location")
+    if location:
+        keys.add(LOCATION_POOL_KEY.format(location.casefold()))
+    # Recomputed rather than read from the stored sketch, which may predate this change
+    values = sketch(signature_tags(signature))
+    if values is not None:
+        keys.update(LSH_POOL_KEY.format(key) for key in band_keys(values))
+    return keys, signature.get("profile_score", DEFAULT_PROFILE_SCORE)
+
+
+def _pool_score(key: str, score: float) -> float:
+    """A member's score in pool `key`: LSH buckets are unranked, so a bucket's read slice is score-blind."""
+    return 0 if key.startswith(LSH_POOL_KEY.format("")) else score
+
+
+async def sync_user_pools(users: List[dict]):
+    """Put each user (user_id + profile_signature [+ location]) in exactly the pools it belongs in."""
+    if not users:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user in users:
+            uid = user["user_id"]
+            keys, score = pool_keys(user)
+            keys = sorted(keys)
+            await SYNC_POOLS_SCRIPT(keys=[USER_POOLS_KEY.format(uid), *keys],
+                                    args=[uid, *(_pool_score(key, score) for key in keys)], client=pipe)
+        # Same changes for the workers' in-memory tag indexes
+        queue_index_changes(pipe, users)
+        await pipe.execute()
+
+
+async def refresh_user_pools(db, user_ids: Iterable[str]):
+    """Re-read users from Mongo and sync their pools (after score flushes or profile edits)."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    users = await db.users.find({"user_id": {"$in": user_ids}}, POOL_USER_PROJECTION).to_list(None)
+    await sync_user_pools(users)
+
+
+async def remove_user_pools(user_id: str):
+    async with redis_client.pipeline(transaction=False) as pipe:
+        await SYNC_POOLS_SCRIPT(keys=[USER_POOLS_KEY.format(user_id)], args=[user_id], client=pipe)
+        pipe.zrem(ALL_POOL_KEY, user_id)  # also when its membership set was lost
+        queue_index_removal(pipe, user_id)
+        await pipe.execute()
+
+
+# ------------------ Online lookups ------------------ #
+
+async def match_candidates(tags: List[str], exclude: Iterable[str] = (),
+                           limit: int = POOL_FETCH_SIZE) -> List[Tuple[float, str, List[str]]]:
+    """
+    Users sharing any of `tags`, as (score, user_id, shared tags) best first, where
+    score = SHARED_TAG_WEIGHT * len(shared) + profile_score.
+
+    Reads the top POOL_FETCH_SIZE of each matching pool in one round trip rather than
+    ZUNIONSTORE-ing whole pools, so the cost is bounded by the viewer's tag count,
+    not by how many users share a popular tag.
+    """
+    tags = list(dict.fromkeys(t.casefold() for t in tags))
+    if not tags:
+        return []
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for tag in tags:
+            pipe.zrevrange(TAG_POOL_KEY.format(tag), 0, POOL_FETCH_SIZE - 1, withscores=True)
+            pipe.zrevrange(CATEGORY_POOL_KEY.format(tag), 0, POOL_FETCH_SIZE - 1, withscores=True)
+        results = await pipe.execute()
+
+    excluded = set(exclude)
+    shared: Dict[str, set] = defaultdict(set)
+    profile_scores: Dict[str, float] = {}
+    for i, members in enumerate(results):
+        tag = tags[i // 2]
+        for uid, score in members:
+            if uid in excluded:
+                continue
+            shared[uid].add(tag)
+            profile_scores[uid] = int(score)
+
+    ranked = [
+        (SHARED_TAG_WEIGHT * len(tag_set) + profile_scores[uid], uid, sorted(tag_set))
+        for uid, tag_set in shared.items()
+    ]
+    ranked.sort(key=lambda r: r[0], reverse=True)
+    return ranked[:limit]
+
+
+async def top_by_score(key: str, min_score="-inf", max_score="+inf",
+                       count: int = 10, exclude: Iterable[str] = (), highest_first: bool = True) -> List[str]:
+    """User ids from one pool within [min_score, max_score], best (or worst) first."""
+    excluded = set(exclude)
+    fetch = count + len(excluded)
+    if highest_first:
+        ids = await redis_client.zrevrangebyscore(key, max_score, min_score, start=0, num=fetch)
+    else:
+        ids = await redis_client.zrangebyscore(key, min_score, max_score, start=0, num=fetch)
+    return [uid for uid in ids if uid not in excluded][:count]
+
+
+async def lsh_candidates(values: Tuple[int, ...], exclude: Iterable[str] = (),
+                         limit: int = SIMILAR_CANDIDATES) -> List[str]:
+    """
+    User ids sharing an LSH bucket with the sketch `values`, most shared buckets first.
+    Each bucket contributes at most LSH_BUCKET_FETCH members; bucket scores are all
+    0, so that slice is arbitrary (by user id) rather than the highest profile scores.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key in band_keys(values):
+            pipe.zrevrange(LSH_POOL_KEY.format(key), 0, LSH_BUCKET_FETCH - 1)
+        buckets = await pipe.execute()
+
+    hits = Counter()
+    for members in buckets:
+        hits.update(members)
+    for uid in exclude:
+        hits.pop(uid, None)
+    return [uid for uid, _ in hits.most_common(limit)]
+
+
+# ------------------ Rebuild ------------------ #
+
+async def _rebuild_batch(db, users: List[dict], seen_key: str):
+    await sync_user_pools(users)
+    if users:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.sadd(seen_key, *[u["user_id"] for u in users])
+            pipe.expire(seen_key, REBUILD_LOCK_TTL)
+            await pipe.execute()
+    vector_ops = stale_vector_ops(users)
+    if vector_ops:
+        await db.users.bulk_write(vector_ops, ordered=False)
+
+
+async def _remove_unseen(db, seen_key: str) -> int:
+    """Drop pool:all members the rebuild did not find (and Mongo confirms are gone) from every pool."""
+    removed, cursor = 0, 0
+    while True:
+        cursor, members = await redis_client.zscan(ALL_POOL_KEY, cursor, count=REBUILD_BATCH)
+        user_ids = [uid for uid, _ in members]
+        seen = await redis_client.smismember(seen_key, user_ids) if user_ids else []
+        unseen = [uid for uid, found in zip(user_ids, seen) if not found]
+        if unseen:
+            # Signed up after the rebuild's scan passed them: keep
+            kept = {u["user_id"] for u in await db.users.find(
+                {"user_id": {"$in": unseen}, "profile_signature": {"$exists": True}}, {"user_id": 1}
+            ).to_list(None)}
+            for uid in unseen:
+                if uid not in kept:
+                    await remove_user_pools(uid)
+                    removed += 1
+        if not cursor:
+            return removed
+
+
+async def rebuild_candidate_pools(db) -> int:
+    """
+    Resync every user with a signature from Mongo, then drop users Mongo no longer
+    has from the pools; returns how many were synced.
+    """
+    seen_key = REBUILD_SEEN_KEY.format(uuid4())
+    synced, batch = 0, []
+    try:
+        async for user in db.users.find({"profile_signature": {"$exists": True}}, POOL_USER_PROJECTION):
+            batch.append(user)
+            if len(batch) >= REBUILD_BATCH:
+                await _rebuild_batch(db, batch, seen_key)
+                synced += len(batch)
+                batch = []
+        await _rebuild_batch(db, batch, seen_key)
+        removed = await _remove_unseen(db, seen_key)
+        if removed:
+            print(f"✅ Removed {removed} deleted users from the candidate pools")
+    finally:
+        await redis_client.delete(seen_key)
+    return synced + len(batch)
+
+
+async def run_candidate_pool_rebuilder(db):
+    """
+    Background task: rebuild the pools every REBUILD_INTERVAL seconds, and right away
+    if they are missing. A lock keeps workers from rebuilding at the same time.
+    """
+    delay = None
+    while True:
+        try:
+            if delay is None:
+                delay = REBUILD_INTERVAL if await redis_client.exists(ALL_POOL_KEY) else 0
+            await asyncio.sleep(delay)
+            delay = REBUILD_INTERVAL
+            token = str(uuid4())
+            if not await redis_client.set(REBUILD_LOCK_KEY, token, nx=True, ex=REBUILD_LOCK_TTL):
+                continue
+            try:
+                await rebuild_candidate_pools(db)
+            finally:
+                if await redis_client.get(REBUILD_LOCK_KEY) == token:
+                    await redis_client.delete(REBUILD_LOCK_KEY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Candidate pool rebuild error: {e}")
+            delay = 60
+
+
+async def main():
+    import argparse
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="userdetails")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        synced = await rebuild_candidate_pools(client[args.db])
+        print(f"✅ Candidate pools rebuilt for {synced} users")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+class CategoryIndex:
+    """
+    Inverted keyword -> category index built once from CATEGORY_KEYWORDS.
+
+    Categories are referred to by their position in the mapping (a small int id),
+    and each keyword maps to a sorted tuple of those ids, so scoring a tag is a
+    single dict lookup instead of a scan over every category's keyword list.
+    """
+
+    def __init__(self, mapping: Mapping[str, Iterable[str]]):
+        self.categories: List[str] = list(mapping)
+        index: Dict[str, set] = {}
+        for category_id, keywords in enumerate(mapping.values()):
+            for keyword in keywords:
+                index.setdefault(keyword.casefold(), set()).add(category_id)
+        self.index: Dict[str, Tuple[int, ...]] = {kw: tuple(sorted(ids)) for kw, ids in index.items()}
+
+    def categories_for(self, tag: str) -> Tuple[int, ...]:
+        return self.index.get(tag.casefold(), ())
+
+    def score(self, weighted_sources: Iterable[Tuple[Iterable[str], int]]) -> Dict[int, int]:
+        """
+        Sum `weight` into every category a tag belongs to, for each (tags, weight) source.
+        Keys keep first-hit order, so callers see categories in the same order as before.
+        """
+        scores: Dict[int, int] = {}
+        index = self.index
+        for tags, weight in weighted_sources:
+            for tag in tags:
+                for category_id in index.get(tag.casefold(), ()):
+                    scores[category_id] = scores.get(category_id, 0) + weight
+        return scores
+
+    def infer(self, weighted_sources: Iterable[Tuple[Iterable[str], int]], threshold: int = 2) -> List[str]:
+        categories = self.categories
+        return [categories[cid] for cid, score in self.score(weighted_sources).items() if score >= threshold]
@@ -0,0 +1,300 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import uuid4
+import asyncio
+import os
+import socket
+
+from pymongo import UpdateOne
+from redis.exceptions import ResponseError
+
+from db.redis_client import delete_cache, redis_client
+from routers.crud.stories import story_view_ops
+from routers.crud.view_stats import record_story_views
+from routers.automations.recommendations.profile_signature import behavioral_tags_update
+from routers.automations.recommendations.signature_vectors import VECTOR_FIELD, signature_fields, signature_vector
+from routers.automations.recommendations.profile_scores import add_score_deltas
+from routers.automations.recommendations.candidate_pools import sync_user_pools
+
+# Interaction weights
+ACTION_WEIGHTS = {"view":1,"skip":-2,"react":2,"share":3,"repost":2}
+
+# Write-behind queue: endpoints XADD an event, a background consumer applies them in batches
+INTERACTION_STREAM   = "interactions:events"
+INTERACTION_GROUP    = "interaction-workers"
+STREAM_MAX_LEN       = 1_000_000          # approximate trim, keeps the stream bounded
+BATCH_SIZE           = 500
+BLOCK_MS             = 1000
+CLAIM_IDLE_MS        = 60 * 1000          # re-take events a dead consumer left pending
+APPLIED_KEY_TTL      = 60 * 60 * 24       # how long an idempotency key is remembered
+MAX_DELIVERIES       = 5                  # then the event goes to the dead-letter stream
+DEAD_LETTER_STREAM   = "interactions:dead"
+DEAD_LETTER_MAX_LEN  = 100_000
+LEARNED_EVENTS_FIELD = "learned_events"   # event ids a user's behavioral counts include
+LEARNED_EVENTS_KEPT  = BATCH_SIZE         # so every event of the last batch is remembered
+
+CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _applied_key(event_id: str) -> str:
+    return f"interactions:applied:{event_id}"
+
+
+async def publish_interaction(action: str, viewer_id: str, owner_id: str, story_id: Optional[str] = None) -> str:
+    """Append an interaction event to the stream and return its idempotency key."""
+    event_id = str(uuid4())
+    await redis_client.xadd(
+        INTERACTION_STREAM,
+        {
+            "event_id": event_id,
+            "action": action,
+            "viewer": viewer_id,
+            "owner": owner_id,
+            "story_id": story_id or "",
+            "ts": datetime.utcnow().isoformat(),
+        },
+        maxlen=STREAM_MAX_LEN,
+        approximate=True,
+    )
+    return event_id
+
+
+def _learning_update(deltas: Dict[str, int], event_ids: List[str]) -> List[dict]:
+    # behavioral_tags_update, plus the events it applies (see plan_interaction_events)
+    learned = {"$ifNull": [f"${LEARNED_EVENTS_FIELD}", []]}
+    return (behavioral_tags_update(deltas) if deltas else []) + [{"$set": {
+        LEARNED_EVENTS_FIELD: {"$slice": [{"$concatArrays": [learned, event_ids]}, -LEARNED_EVENTS_KEPT]}
+    }}]
+
+
+async def plan_interaction_events(db, events: List[dict]) -> dict:
+    """
+    Read the involved users once and compute every write for a batch of events:
+    per-user behavioral learning, owner profile scores, view tracking and the
+    recommendation caches to drop. Nothing is written yet.
+
+    Every write is idempotent per event id, so a plan can be written again after
+    a failure part-way through: learning records its event ids on the user (and
+    skips the ones already there), score deltas and view totals keep a marker per
+    event in Redis, and the view upserts and PFADDs are idempotent anyway.
+    """
+    user_ids = list({e["viewer"] for e in events} | {e["owner"] for e in events})
+    users = await db.users.find(
+        {"user_id": {"$in": user_ids}},
+        {"user_id": 1, "location": 1, "profile_signature": 1, LEARNED_EVENTS_FIELD: 1}
+    ).to_list(None)
+    signatures: Dict[str, dict] = {u["user_id"]: u.get("profile_signature") or {} for u in users}
+    already_learned = {u["user_id"]: set(u.get(LEARNED_EVENTS_FIELD) or []) for u in users}
+
+    viewers = set()
+    category_deltas: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    learned_events: Dict[str, List[str]] = defaultdict(list)
+    learners = set()
+    score_deltas, view_ops, log_ops, views, view_events = [], [], [], [], []
+
+    for e in events:
+        action, viewer, owner = e["action"], e["viewer"], e["owner"]
+        owner_sig = signatures.get(owner)
+        weight = ACTION_WEIGHTS.get(action, 0)
+        viewers.add(viewer)
+        # Users without a profile_signature have nothing to learn into
+        if owner_sig and signatures.get(viewer) and weight and owner_sig.get("category"):
+            learners.add(viewer)
+            if e["event_id"] not in already_learned[viewer]:
+                learned_events[viewer].append(e["event_id"])
+                for c in owner_sig["category"]:
+                    if "." not in c and not c.startswith("$"):
+                        category_deltas[viewer][c] += weight
+        if owner in signatures:
+            score_deltas.append((e["event_id"], owner, weight))
+        if action == "view" and e.get("story_id"):
+            watch, log = story_view_ops(viewer, owner, e["story_id"])
+            view_ops.append(watch)
+            log_ops.append(log)
+            views.append((viewer, owner, e["story_id"]))
+            view_events.append(e["event_id"])
+
+    user_ops = []
+    for v, event_ids in learned_events.items():
+        deltas = {c: d for c, d in category_deltas[v].items() if d}
+        # Counters are added server-side, so concurrent consumers never overwrite each other;
+        # the filter keeps a replayed event from being counted twice
+        user_ops.append(UpdateOne(
+            {"user_id": v, LEARNED_EVENTS_FIELD: {"$nin": event_ids}},
+            _learning_update(deltas, event_ids)
+        ))
+    return {
+        "user_ops": user_ops,
+        # Including users learned by an earlier attempt, whose derived fields may be stale
+        "learners": learners,
+        "score_deltas": score_deltas,
+        "view_ops": view_ops,
+        "log_ops": log_ops,
+        "views": views,
+        "view_events": view_events,
+        "viewers": viewers,
+    }
+
+
+async def _refresh_learned_users(db, user_ids: set):
+    """
+    Re-read users after learning and, for those whose stored signature vector no
+    longer matches their signature (behavioral_tags changed), re-encode the derived
+    signature fields and sync their pools. The $set only applies if behavioral_tags
+    still hold what was read; otherwise a later writer changed them and refreshes
+    the fields itself.
+    """
+    users = await db.users.find(
+        {"user_id": {"$in": list(user_ids)}},
+        {"user_id": 1, "location": 1, "profile_signature": 1, VECTOR_FIELD: 1}
+    ).to_list(None)
+    changed = [
+        u for u in users
+        if u.get("profile_signature") and u.get(VECTOR_FIELD) != signature_vector(u["profile_signature"])
+    ]
+    if not changed:
+        return
+    await db.users.bulk_write([
+        UpdateOne(
+            {"user_id": u["user_id"], "profile_signature.behavioral_tags": u["profile_signature"].get("behavioral_tags")},
+            {"$set": signature_fields(u["profile_signature"])}
+        )
+        for u in changed
+    ], ordered=False)
+    await sync_user_pools(changed)
+
+
+async def write_interaction_events(db, plan: dict):
+    """Write a plan from plan_interaction_events, one bulk_write per collection."""
+    # Clamped server-side by the periodic profile score flush
+    await add_score_deltas(plan["score_deltas"])
+
+    if plan["user_ops"]:
+        await db.users.bulk_write(plan["user_ops"], ordered=False)
+    if plan["learners"]:
+        await _refresh_learned_users(db, plan["learners"])
+    if plan["view_ops"]:
+        await db.user_views.bulk_write(plan["view_ops"], ordered=False)
+        await db.viewer_logs.bulk_write(plan["log_ops"], ordered=False)
+        await record_story_views(plan["views"], plan["view_events"])
+    await delete_cache(*[f"recommendations:{v}" for v in plan["viewers"]])
+
+
+async def apply_interaction_events(db, events: List[dict]):
+    """Apply a batch of events (see plan_interaction_events)."""
+    if events:
+        await write_interaction_events(db, await plan_interaction_events(db, events))
+
+
+async def _process(db, entries):
+    """
+    Claim every event with SET NX before applying it, apply the ones claimed here
+    and ack all of them; an event redelivered after it was applied fails its claim
+    and is skipped. If applying fails, the claims are released and nothing is
+    acked, so the retry applies the events again (every write is idempotent per
+    event id, see plan_interaction_events).
+    """
+    if not entries:
+        return
+    message_ids = [mid for mid, _ in entries]
+    events = [fields for _, fields in entries if fields]  # trimmed entries come back empty
+
+    fresh = []
+    if events:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for e in events:
+                pipe.set(_applied_key(e["event_id"]), CONSUMER_NAME, nx=True, ex=APPLIED_KEY_TTL)
+            claims = await pipe.execute()
+        fresh = [e for e, claimed in zip(events, claims) if claimed]
+
+    if fresh:
+        try:
+            await write_interaction_events(db, await plan_interaction_events(db, fresh))
+        except Exception:
+            await redis_client.delete(*[_applied_key(e["event_id"]) for e in fresh])
+            raise
+
+    await redis_client.xack(INTERACTION_STREAM, INTERACTION_GROUP, *message_ids)
+
+
+async def _dead_letter(entries) -> list:
+    """
+    Move entries already delivered MAX_DELIVERIES times to DEAD_LETTER_STREAM (and
+    ack them) so a poison event cannot be re-claimed forever; returns the rest.
+    """
+    if not entries:
+        return entries
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for mid, _ in entries:
+            pipe.xpending_range(INTERACTION_STREAM, INTERACTION_GROUP, min=mid, max=mid, count=1)
+        pending = await pipe.execute()
+
+    dead = [(mid, fields) for (mid, fields), p in zip(entries, pending) if p and p[0]["times_delivered"] > MAX_DELIVERIES]
+    if not dead:
+        return entries
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for mid, fields in dead:
+            pipe.xadd(DEAD_LETTER_STREAM, {**(fields or {}), "message_id": mid},
+                      maxlen=DEAD_LETTER_MAX_LEN, approximate=True)
+        pipe.xack(INTERACTION_STREAM, INTERACTION_GROUP, *[mid for mid, _ in dead])
+        await pipe.execute()
+    print(f"⚠️ {len(dead)} interaction events moved to {DEAD_LETTER_STREAM} after {MAX_DELIVERIES} deliveries")
+    dead_ids = {mid for mid, _ in dead}
+    return [entry for entry in entries if entry[0] not in dead_ids]
+
+
+async def _process_isolated(db, entries):
+    """Process a batch; if it fails, retry event by event so one bad event holds back only itself."""
+    try:
+        await _process(db, entries)
+    except Exception as e:
+        if len(entries) <= 1:
+            raise
+        print(f"❌ Interaction batch failed ({e}); retrying events one by one")
+        for entry in entries:
+            try:
+                await _process(db, [entry])
+            except Exception as e:
+                # Stays pending: re-claimed later, dead-lettered after MAX_DELIVERIES
+                print(f"❌ Interaction event {entry[0]} failed: {e}")
+
+
+async def _ensure_group():
+    try:
+        await redis_client.xgroup_create(INTERACTION_STREAM, INTERACTION_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def run_interaction_consumer(db):
+    """
+    Background task: at-least-once delivery through a consumer group.
+    Events are acked only after they are applied, entries left pending by a
+    dead worker (or by a failure) are re-taken with XAUTOCLAIM, idempotency keys
+    claimed before applying make events redelivered after they were applied no-ops,
+    writes are idempotent per event so a failed batch can be applied again, and
+    events that keep failing are moved to DEAD_LETTER_STREAM after MAX_DELIVERIES attempts.
+    """
+    await _ensure_group()
+
+    while True:
+        try:
+            _, claimed, *_ = await redis_client.xautoclaim(
+                INTERACTION_STREAM, INTERACTION_GROUP, CONSUMER_NAME,
+                min_idle_time=CLAIM_IDLE_MS, count=BATCH_SIZE
+            )
+            await _process_isolated(db, await _dead_letter(claimed))
+
+            resp = await redis_client.xreadgroup(
+                INTERACTION_GROUP, CONSUMER_NAME, {INTERACTION_STREAM: ">"},
+                count=BATCH_SIZE, block=BLOCK_MS
+            )
+            await _process_isolated(db, resp[0][1] if resp else [])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Unacked events stay pending and are retried
+            print(f"❌ Interaction consumer error: {e}")
+            await asyncio.sleep(1)
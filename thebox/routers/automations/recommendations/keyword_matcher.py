@@ -0,0 +1,55 @@
+import re
+from typing import Dict, Iterable, Set
+
+# Zero-width word boundaries, same definition `\b` uses in the old per-keyword regexes
+_BOUNDARY = re.compile(r"\b")
+_END = ""  # trie key marking "a keyword ends here"
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword that occurs in a text as a whole word (`\\b{keyword}\\b`)
+    in a single pass, instead of one regex search per keyword.
+
+    Keywords are stored in a character trie built once. The text's word boundaries
+    are located with one C-level regex scan, then the trie is walked only from those
+    boundary positions, so overlapping keywords ("movie" / "movie review") are all found.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._trie: Dict[str, dict] = {}
+        self.keywords: Set[str] = set()
+        for keyword in keywords:
+            keyword = keyword.casefold()
+            if not keyword or keyword in self.keywords:
+                continue
+            self.keywords.add(keyword)
+            node = self._trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[_END] = keyword
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords found in `text` (matching is case-insensitive)."""
+        if not text:
+            return set()
+        text = text.casefold()
+        boundaries = {m.start() for m in _BOUNDARY.finditer(text)}
+        trie = self._trie
+        size = len(text)
+        found: Set[str] = set()
+        for start in boundaries:
+            node = trie
+            i = start
+            while i < size:
+                node = node.get(text[i])
+                if node is None:
+                    break
+                i += 1
+                keyword = node.get(_END)
+                if keyword is not None and i in boundaries:
+                    found.add(keyword)
+        return found
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword.casefold() in self.keywords
@@ -0,0 +1,79 @@
+"""
+MinHash sketches of profile signatures for "similar users" lookups.
+
+A user's sketch is NUM_PERM minimums of (a * crc32(tag) + b) mod 2**61 - 1 over
+the union of interests, bio_tags, behavioral_tags and category; the fraction of
+equal positions between two sketches estimates the Jaccard similarity of those
+tag sets. It is stored with the user as
+
+    minhash: {"version": MINHASH_VERSION, "values": <NUM_PERM little-endian uint64s>}
+
+For LSH the sketch is cut into LSH_BANDS bands of LSH_ROWS rows; users sharing
+any band bucket are candidates. Two users collide with probability
+1 - (1 - J**LSH_ROWS)**LSH_BANDS, roughly a step at J = (1 / LSH_BANDS) ** (1 / LSH_ROWS).
+The buckets themselves are candidate pools (see candidate_pools).
+"""
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+import random
+import zlib
+
+MINHASH_FIELD = "minhash"
+NUM_PERM      = 64
+LSH_BANDS     = 32
+LSH_ROWS      = NUM_PERM // LSH_BANDS
+MINHASH_SEED  = 1
+MINHASH_VERSION = NUM_PERM * 1000 + MINHASH_SEED
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(MINHASH_SEED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+
+@lru_cache(maxsize=100_000)
+def tag_hashes(tag: str) -> Tuple[int, ...]:
+    """The NUM_PERM permuted hashes of one (casefolded) tag; the vocabulary is small, so cached."""
+    x = zlib.crc32(tag.encode())
+    return tuple((a * x + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def sketch(tags: Iterable[str]) -> Optional[Tuple[int, ...]]:
+    """MinHash of a tag set, or None for an empty set."""
+    hashed = [tag_hashes(tag) for tag in {t.casefold() for t in tags}]
+    if not hashed:
+        return None
+    return tuple(map(min, zip(*hashed)))
+
+
+def minhash_doc(tags: Iterable[str]) -> Optional[dict]:
+    """The MINHASH_FIELD value for a tag set (None when there are no tags)."""
+    values = sketch(tags)
+    if values is None:
+        return None
+    return {"version": MINHASH_VERSION, "values": array("Q", values).tobytes()}
+
+
+def stored_sketch(user: dict) -> Optional[Tuple[int, ...]]:
+    """A user's stored sketch, or None if missing / computed with other parameters."""
+    doc = user.get(MINHASH_FIELD)
+    if not doc or doc.get("version") != MINHASH_VERSION:
+        return None
+    return tuple(array("Q", doc["values"]))
+
+
+def band_keys(values: Tuple[int, ...], bands: int = LSH_BANDS) -> List[str]:
+    """One "{band}:{bucket}" key per band of the sketch."""
+    rows = len(values) // bands
+    return [
+        f"{band}:{zlib.crc32(array('Q', values[band * rows:(band + 1) * rows]).tobytes()):08x}"
+        for band in range(bands)
+    ]
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
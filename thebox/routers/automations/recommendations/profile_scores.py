@@ -0,0 +1,150 @@
+from typing import Dict, Iterable, List, Tuple
+from uuid import uuid4
+import asyncio
+
+from pymongo import UpdateOne
+from redis.exceptions import ResponseError
+
+from db.redis_client import redis_client
+
+PROFILE_LIMITS = {"min":25,"max":200}
+DEFAULT_PROFILE_SCORE = 50
+
+# Deltas accumulate in a Redis hash (HINCRBY) and are flushed to Mongo periodically
+PENDING_SCORES_KEY  = "profile_scores:pending"
+FLUSHING_SCORES_KEY = "profile_scores:flushing"
+FLUSH_LOCK_KEY      = "profile_scores:flush_lock"
+FLUSH_ID_FIELD      = ":flush_id"   # stored in the flushing hash, never a user id
+FLUSHES_FIELD       = "score_flushes"
+FLUSHES_KEPT        = 10           # flush ids remembered per user
+FLUSH_LOCK_TTL      = 30   # secs
+FLUSH_INTERVAL      = 5    # secs
+APPLIED_EVENT_KEY   = "profile_scores:applied:{}"   # event ids whose delta is queued
+APPLIED_EVENT_TTL   = 60 * 60 * 24                  # secs
+
+# Queue each event's delta once: KEYS[1] is the pending hash, KEYS[2..] the events'
+# markers; ARGV[1] is the marker TTL, then (user id, delta) per event.
+ADD_DELTAS_SCRIPT = redis_client.register_script("""
+for i = 2, #KEYS do
+    if redis.call('SET', KEYS[i], 1, 'NX', 'EX', ARGV[1]) then
+        redis.call('HINCRBY', KEYS[1], ARGV[2 * i - 2], ARGV[2 * i - 1])
+    end
+end
+""")
+
+
+def _clamp(score: int) -> int:
+    return max(PROFILE_LIMITS["min"], min(score, PROFILE_LIMITS["max"]))
+
+
+def _clamped_score_update(delta: int, flush_id: str) -> list:
+    # Pipeline update: $add the delta, then clamp with $min/$max on the server, and
+    # remember the flush so replaying it is a no-op (see flush_profile_scores)
+    return [{"$set": {
+        "profile_signature.profile_score": {"$max": [
+            PROFILE_LIMITS["min"],
+            {"$min": [
+                PROFILE_LIMITS["max"],
+                {"$add": [{"$ifNull": ["$profile_signature.profile_score", DEFAULT_PROFILE_SCORE]}, delta]}
+            ]}
+        ]},
+        FLUSHES_FIELD: {"$slice": [
+            {"$concatArrays": [{"$ifNull": [f"${FLUSHES_FIELD}", []]}, [flush_id]]}, -FLUSHES_KEPT
+        ]},
+    }}]
+
+
+async def add_score_deltas(deltas: List[Tuple[str, str, int]]):
+    """
+    Queue (event id, target user id, delta) score changes in one script call; an
+    event whose delta was already queued is skipped, so replaying events is safe.
+    """
+    deltas = [(event_id, uid, d) for event_id, uid, d in deltas if d]
+    if not deltas:
+        return
+    await ADD_DELTAS_SCRIPT(
+        keys=[PENDING_SCORES_KEY, *(APPLIED_EVENT_KEY.format(event_id) for event_id, _, _ in deltas)],
+        args=[APPLIED_EVENT_TTL, *(v for _, uid, d in deltas for v in (uid, d))],
+    )
+
+
+async def current_profile_scores(users: Iterable[dict]) -> Dict[str, int]:
+    """
+    Scores of already-read users (user_id, profile_signature.profile_score and
+    FLUSHES_FIELD) with the deltas not flushed yet added: the flushing batch, unless
+    the user already records its flush id, then the pending one, each clamped as
+    the flush clamps it.
+    """
+    users = list(users)
+    if not users:
+        return {}
+    user_ids = [u["user_id"] for u in users]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hmget(FLUSHING_SCORES_KEY, [FLUSH_ID_FIELD, *user_ids])
+        pipe.hmget(PENDING_SCORES_KEY, user_ids)
+        (flush_id, *flushing), pending = await pipe.execute()
+
+    scores = {}
+    for user, flushing_delta, pending_delta in zip(users, flushing, pending):
+        score = (user.get("profile_signature") or {}).get("profile_score", DEFAULT_PROFILE_SCORE)
+        if flushing_delta and int(flushing_delta) and flush_id not in (user.get(FLUSHES_FIELD) or []):
+            score = _clamp(score + int(flushing_delta))
+        if pending_delta and int(pending_delta):
+            score = _clamp(score + int(pending_delta))
+        scores[user["user_id"]] = score
+    return scores
+
+
+async def flush_profile_scores(db) -> int:
+    """
+    Apply all pending deltas with a single bulk_write and return how many users changed.
+
+    Pending deltas are moved to FLUSHING_SCORES_KEY with RENAME, so increments that
+    arrive during the flush go to a fresh hash. Each batch gets a flush id, which
+    every user update records and is filtered on, so a batch left behind by a
+    crashed flush (or re-read after the flush lock expired) is picked up by the
+    next flush without applying any delta twice.
+    """
+    token = str(uuid4())
+    if not await redis_client.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+        return 0
+    try:
+        if not await redis_client.exists(FLUSHING_SCORES_KEY):
+            try:
+                await redis_client.rename(PENDING_SCORES_KEY, FLUSHING_SCORES_KEY)
+            except ResponseError:
+                return 0  # nothing pending
+
+        await redis_client.hsetnx(FLUSHING_SCORES_KEY, FLUSH_ID_FIELD, str(uuid4()))
+        deltas = await redis_client.hgetall(FLUSHING_SCORES_KEY)
+        flush_id = deltas.pop(FLUSH_ID_FIELD, None)
+        if flush_id is None:
+            return 0  # another flush finished this batch meanwhile
+        changed = [uid for uid, delta in deltas.items() if int(delta)]
+        ops = [
+            UpdateOne({"user_id": uid, FLUSHES_FIELD: {"$ne": flush_id}}, _clamped_score_update(int(deltas[uid]), flush_id))
+            for uid in changed
+        ]
+        if ops:
+            await db.users.bulk_write(ops, ordered=False)
+        await redis_client.delete(FLUSHING_SCORES_KEY)
+        if changed:
+            # Re-score the candidate pools with the clamped values Mongo now holds
+            from routers.automations.recommendations.candidate_pools import refresh_user_pools
+            await refresh_user_pools(db, changed)
+        return len(ops)
+    finally:
+        if await redis_client.get(FLUSH_LOCK_KEY) == token:
+            await redis_client.delete(FLUSH_LOCK_KEY)
+
+
+async def run_profile_score_flusher(db):
+    """Background task: flush pending score deltas every FLUSH_INTERVAL seconds."""
+    while True:
+        try:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await flush_profile_scores(db)
+        except asyncio.CancelledError:
+            raise  # unflushed deltas stay in Redis for the next flush
+        except Exception as e:
+            print(f"❌ Profile score flush error: {e}")
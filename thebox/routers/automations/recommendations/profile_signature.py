@@ -1,8 +1,9 @@
 from collections import defaultdict
-from typing import List, Optional
+from typing import Dict, List, Optional
 from db.models.users import ProfileSignature
 from .categories import CATEGORY_KEYWORDS
-import re
+from .keyword_matcher import KeywordMatcher
+from .category_index import CategoryIndex
 
 # Normalize categories and keywords to lowercase for consistent matching
 def _normalize_keywords(mapping):
@@ -11,34 +12,22 @@ def _normalize_keywords(mapping):
 
 CATEGORY_KEYWORDS = _normalize_keywords(CATEGORY_KEYWORDS)
 
+# Compiled once at import; reusable for captions or any other free text
+KEYWORD_MATCHER = KeywordMatcher(kw for keywords in CATEGORY_KEYWORDS.values() for kw in keywords)
+CATEGORY_INDEX = CategoryIndex(CATEGORY_KEYWORDS)
+
 
 def extract_tags_from_bio(bio: str) -> List[str]:
-    tags: List[str] = []
-    bio_norm = bio.casefold()
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            pattern = rf"\b{re.escape(keyword)}\b"
-            if re.search(pattern, bio_norm):
-                tags.append(keyword)
-    return list(set(tags))  # unique, already lowercase
+    return list(KEYWORD_MATCHER.find(bio))  # unique, already lowercase
 
 
 def infer_categories(signature: ProfileSignature) -> List[str]:
-    category_scores = defaultdict(int)
-    sources = [signature.bio_tags, signature.interests, signature.behavioral_tags]
-    for source in sources:
-        for tag in source:
-            tag_norm = tag.casefold()
-            for category, keywords in CATEGORY_KEYWORDS.items():
-                if tag_norm in keywords:
-                    category_scores[category] += 1
-    # Extra weight for behavioral tags
-    for tag in signature.behavioral_tags:
-        tag_norm = tag.casefold()
-        for category, keywords in CATEGORY_KEYWORDS.items():
-            if tag_norm in keywords:
-                category_scores[category] += 1
-    return [cat for cat, score in category_scores.items() if score >= 2]
+    # Behavioral tags count double
+    return CATEGORY_INDEX.infer([
+        (signature.bio_tags, 1),
+        (signature.interests, 1),
+        (signature.behavioral_tags, 2),
+    ])
 
 
 def generate_profile_signature(user: dict) -> ProfileSignature:
@@ -72,14 +61,30 @@ def matching_tags(signature: ProfileSignature) -> List[str]:
     return [tag for tag, _ in sorted_tags]
 
 
-def update_behavioral_tags(signature: dict, category: str, action: str) -> dict:
-    weights = {"view": 1, "react": 2, "repost": 2, "share": 3, "skip": -2}
-    score = weights.get(action, 0)
-    signature.setdefault("category_test", {})
-    signature.setdefault("behavioral_tags", [])
-    signature["category_test"][category] = max(0, signature["category_test"].get(category, 0) + score)
-    if signature["category_test"][category] >= 5 and category not in signature["behavioral_tags"]:
-        signature["behavioral_tags"].append(category)
-    if signature["category_test"][category] < 2 and category in signature["behavioral_tags"]:
-        signature["behavioral_tags"].remove(category)
-    return signature
\ No newline at end of file
+BEHAVIORAL_TAG_ADD    = 5   # category_test count at which a category becomes a behavioral tag
+BEHAVIORAL_TAG_REMOVE = 2   # ... and below which it is dropped again
+
+
+def behavioral_tags_update(deltas: Dict[str, int]) -> List[dict]:
+    """
+    Aggregation-pipeline update adding `deltas` to profile_signature.category_test
+    (floored at 0) and re-deriving behavioral_tags from the new counts, so it is
+    applied atomically against the stored document rather than a stale read.
+    A batch's net delta per category is applied at once, so the floor is only
+    taken at the end of the batch.
+    """
+    counts = {c: f"profile_signature.category_test.{c}" for c in deltas}
+    stages = [{"$set": {
+        field: {"$max": [0, {"$add": [{"$ifNull": [f"${field}", 0]}, deltas[c]]}]}
+        for c, field in counts.items()
+    }}]
+    for c, field in counts.items():
+        tags = {"$ifNull": ["$profile_signature.behavioral_tags", []]}
+        stages.append({"$set": {"profile_signature.behavioral_tags": {"$switch": {
+            "branches": [
+                {"case": {"$gte": [f"${field}", BEHAVIORAL_TAG_ADD]}, "then": {"$setUnion": [tags, [c]]}},
+                {"case": {"$lt": [f"${field}", BEHAVIORAL_TAG_REMOVE]}, "then": {"$setDifference": [tags, [c]]}},
+            ],
+            "default": tags,
+        }}}})
+    return stages
@@ -5,32 +5,38 @@ from db.models.stories import StoryDocument, Story, UserPreview
 from db.models.users import ProfileSignature
 from fastapi import HTTPException
 from typing import List, Dict, Set
-from db.db import get_collection
+from routers.automations.recommendations.candidate_pools import (
+    ALL_POOL_KEY, LOCATION_POOL_KEY, POOL_FETCH_SIZE, SHARED_TAG_WEIGHT, lsh_candidates, match_candidates, top_by_score
+)
+from routers.automations.recommendations import tag_index
+from routers.automations.recommendations.minhash import MINHASH_FIELD, estimate_similarity, sketch, stored_sketch
+from routers.automations.recommendations.profile_scores import FLUSHES_FIELD, current_profile_scores
+from routers.automations.recommendations.signature_vectors import (
+    VECTOR_FIELD, jaccard_similarities, score_candidates, signature_tags
+)
+import asyncio
 import random
 
 RECOMMENDATION_CACHE_TTL = 3600  # secs = 1h
 RESPONSE_SIZE         = 10
-MATCH_RATIO           = 0.45
+MATCH_RATIO           = 0.30
+SIMILAR_RATIO         = 0.15
 POPULAR_RATIO         = 0.35
-TEST_RATIO            = 1 - MATCH_RATIO - POPULAR_RATIO
+TEST_RATIO            = 1 - MATCH_RATIO - SIMILAR_RATIO - POPULAR_RATIO
+HYDRATION_CONCURRENCY = 2     # max pools of one request hydrating against Mongo at once
+SIMILAR_POOL_SIZE     = 50    # LSH candidates considered for the similar pool
+MIN_SIMILARITY        = 0.1   # Jaccard
 
+CANDIDATE_PROJECTION  = {"user_id": 1, "username": 1, "profile_image_url": 1,
+                         VECTOR_FIELD: 1, "profile_signature.profile_score": 1, FLUSHES_FIELD: 1}
+SIMILAR_PROJECTION    = {**CANDIDATE_PROJECTION, MINHASH_FIELD: 1}
 
 
-async def build_story_document(user: dict, viewer_id: str) -> StoryDocument | None:
-    story_collection = get_collection("stories")
-    interaction_collection = get_collection("interactions")
 
-    user_id = user["user_id"]
-
-    story_doc = await story_collection.find_one({"_id": user_id})
+def build_story_document(user: dict, story_doc: dict | None, interaction: dict | None) -> StoryDocument | None:
     if not story_doc or not story_doc.get("stories"):
         return None
 
-    interaction = await interaction_collection.find_one({
-        "viewer_id": viewer_id,
-        "target_id": user_id
-    })
-
     seen_story_ids = set()
     if interaction:
         seen_story_ids.update(interaction.get("viewed_story_ids", []))
@@ -43,117 +49,207 @@ async def build_story_document(user: dict, viewer_id: str) -> StoryDocument | No
 
     return StoryDocument(
         user=UserPreview(
-            user_id=user_id,
+            user_id=user["user_id"],
             username=user.get("username"),
             profile_pic=user.get("profile_image_url")
         ),
         stories=[Story(**s) for s in unseen_stories]
     )
 
-async def get_recommendations(user_id: str) -> List[StoryDocument]:
-    db = {
-        "users": get_collection("users"),
-        "stories": get_collection("stories"),
-        "interactions": get_collection("interactions")
+
+async def hydrate_story_documents(db: dict, users: List[dict], viewer_id: str,
+                                  semaphore: asyncio.Semaphore) -> List[StoryDocument | None]:
+    """
+    Build the StoryDocument of every candidate in `users` with one `$in` query on
+    `stories` and one on `interactions`, instead of two `find_one`s per candidate.
+    The result is aligned with `users` (None where the user has nothing unseen).
+    """
+    user_ids = list({u["user_id"] for u in users})
+    if not user_ids:
+        return []
+
+    async with semaphore:
+        story_docs = await db["stories"].find({"_id": {"$in": user_ids}}).to_list(None)
+        interactions = await db["interactions"].find({
+            "viewer_id": viewer_id,
+            "target_id": {"$in": user_ids}
+        }).to_list(None)
+
+    stories_by_user = {d["_id"]: d for d in story_docs}
+    interaction_by_user = {i["target_id"]: i for i in interactions}
+
+    return [
+        build_story_document(u, stories_by_user.get(u["user_id"]), interaction_by_user.get(u["user_id"]))
+        for u in users
+    ]
+
+
+async def find_matches(tags: List[str], exclude=(), limit: int = POOL_FETCH_SIZE) -> List[tuple]:
+    """(score, user_id, shared tags) best first: this worker's tag index once it is loaded, the Redis pools until then."""
+    index = tag_index.TAG_INDEX
+    if index.ready:
+        return index.top_k(tags, limit, SHARED_TAG_WEIGHT, exclude=exclude)
+    return await match_candidates(tags, exclude=exclude, limit=limit)
+
+
+def rank_matches(tags: List[str], matched: List[tuple], users: Dict[str, dict],
+                 scores: Dict[str, int]) -> List[tuple]:
+    """
+    Re-rank pool matches (score, user_id, shared tags) by exact tag overlap from the
+    stored signature vectors and current profile scores (see current_profile_scores),
+    as (score, user, shared tags) best first. The pools only see a user's tags that
+    made a pool's top slice; users without a current vector keep their pool tags.
+    """
+    found = [(m, users[m[1]]) for m in matched if m[1] in users]
+    ranked = []
+    for ((_, uid, pool_shared), user), (overlap, shared) in zip(found, score_candidates(tags, [u for _, u in found])):
+        if overlap is None:
+            ranked.append((SHARED_TAG_WEIGHT * len(pool_shared) + scores[uid], user, pool_shared))
+        elif overlap:
+            ranked.append((SHARED_TAG_WEIGHT * overlap + scores[uid], user, shared))
+    ranked.sort(key=lambda r: r[0], reverse=True)
+    return ranked
+
+
+def user_sketch(user: dict):
+    # From the signature itself: cheap (hashes are cached per tag) and never stale
+    return sketch(signature_tags(user.get("profile_signature") or {}))
+
+
+def rank_similar(tags: List[str], values, users: List[dict]) -> List[tuple]:
+    """
+    (Jaccard similarity, user) best first, at least MIN_SIMILARITY: exact from the
+    stored signature vectors, estimated from the MinHash sketches without one.
+    """
+    ranked = []
+    for user, similarity in zip(users, jaccard_similarities(tags, users)):
+        if similarity is None:
+            other = stored_sketch(user)
+            similarity = estimate_similarity(values, other) if other else 0.0
+        if similarity >= MIN_SIMILARITY:
+            ranked.append((similarity, user))
+    ranked.sort(key=lambda r: r[0], reverse=True)
+    return ranked
+
+
+async def find_similar_users(db, user_id: str, limit: int = 10) -> List[dict]:
+    """Users whose tags overlap most with `user_id`'s, from the LSH buckets (see minhash)."""
+    me = await db.users.find_one({"user_id": user_id}, {"user_id": 1, "profile_signature": 1})
+    if not me:
+        raise HTTPException(status_code=404, detail="User not found")
+    values = user_sketch(me)
+    if values is None:
+        return []
+
+    candidate_ids = await lsh_candidates(values, exclude={user_id})
+    users = {
+        u["user_id"]: u
+        for u in await db.users.find({"user_id": {"$in": candidate_ids}}, SIMILAR_PROJECTION).to_list(None)
     }
+    tags = list({t.casefold() for t in signature_tags(me.get("profile_signature") or {})})
+    ranked = rank_similar(tags, values, [users[uid] for uid in candidate_ids if uid in users])
+    return [
+        {
+            "user_id": user["user_id"],
+            "username": user["username"],
+            "profile_image_url": user.get("profile_image_url"),
+            "similarity": round(similarity, 3),
+        }
+        for similarity, user in ranked[:limit]
+    ]
 
+
+async def get_recommendations(db, user_id: str) -> List[StoryDocument]:
     me = await db["users"].find_one({"user_id": user_id})
     if not me or "profile_signature" not in me:
         raise HTTPException(status_code=404, detail="User profile not found")
 
-    my_tags = me["profile_signature"].get("tags", [])
-    location = me.get("location")
-    contacts = set(me.get("contacts", []))
-
-    # --- 1) Matched pool
-    candidates = await db["users"].find({
-        "user_id": {"$ne": user_id},
-        "profile_signature.tags": {"$in": my_tags}
-    }).to_list(length=200)
-
-    matched = []
-    for o in candidates:
-        other_sig = ProfileSignature(**o["profile_signature"])
-        shared = set(my_tags) & set(other_sig.tags)
-        if shared:
-            score = len(shared) * 5 + other_sig.profile_score
-            story_doc = await build_story_document(o, user_id)
-            if story_doc:
-                matched.append((score, story_doc))
+    my_sig = ProfileSignature(**me["profile_signature"])
+    my_tags = matching_tags(my_sig)
+    my_sketch = user_sketch(me)
+    location = my_sig.location or me.get("location")
+    contacts = [c for c in dict.fromkeys(me.get("contacts", [])) if c != user_id]
+    exclude = {user_id}
 
-    matched.sort(key=lambda x: x[0], reverse=True)
-    matched = [sd for _, sd in matched]
+    async def no_candidates():
+        return []
 
-    # --- 2) Popular pool
-    popular_raw = []
-    if location:
-        local = await db["users"].find({
-            "user_id": {"$ne": user_id},
-            "location": location,
-            "profile_signature.profile_score": {"$gte": 50}
-        }).sort("profile_signature.profile_score", -1).limit(5).to_list(5)
-        popular_raw.extend(local)
-
-    global_pop = await db["users"].find({
-        "user_id": {"$ne": user_id},
-        "profile_signature.profile_score": {"$gte": 50}
-    }).sort("profile_signature.profile_score", -1).limit(10).to_list(10)
-
-    popular_raw.extend([u for u in global_pop if u not in popular_raw])
-
-    popular = []
-    for u in popular_raw:
-        story_doc = await build_story_document(u, user_id)
-        if story_doc:
-            popular.append(story_doc)
-
-    # --- 3) Test pool (low score + contacts)
-    test_raw = []
+    # --- 1-3) Candidate ids from the tag index / precomputed Redis pools (see candidate_pools)
+    lookups = [find_matches(my_tags, exclude=exclude),
+               lsh_candidates(my_sketch, exclude=exclude, limit=SIMILAR_POOL_SIZE) if my_sketch else no_candidates(),
+               top_by_score(ALL_POOL_KEY, min_score=50, count=10, exclude=exclude)]
     if location:
-        newbies = await db["users"].find({
-            "user_id": {"$ne": user_id},
-            "location": location,
-            "profile_signature.profile_score": {"$lte": 40}
-        }).limit(20).to_list(20)
-        test_raw.extend(newbies)
-
-    if contacts:
-        contact_users = await db["users"].find({
-            "user_id": {"$in": list(contacts)},
-            "user_id": {"$ne": user_id}
-        }).limit(20).to_list(20)
-        test_raw.extend(contact_users)
-
-    seen_ids: Set[str] = set()
-    test = []
-    for u in test_raw:
-        uid = u["user_id"]
-        if uid in seen_ids:
-            continue
-        seen_ids.add(uid)
-        story_doc = await build_story_document(u, user_id)
-        if story_doc:
-            test.append(story_doc)
+        local_key = LOCATION_POOL_KEY.format(location.casefold())
+        lookups += [top_by_score(local_key, min_score=50, count=5, exclude=exclude),
+                    top_by_score(local_key, max_score=40, count=20, exclude=exclude, highest_first=False)]
+    matched_ids, similar_ids, global_pop, *local = await asyncio.gather(*lookups)
+    local_pop, newbies = local or ([], [])
+
+    # Popular: local first, then global. Test: low-score locals, then contacts.
+    popular_ids = list(dict.fromkeys(local_pop + global_pop))
+    test_ids = list(dict.fromkeys(newbies + contacts[:20]))
+
+    # One read for the preview fields and signature vector of every candidate (plus the
+    # sketch, for similar candidates without a current vector)
+    candidate_ids = list({uid for _, uid, _ in matched_ids} | set(similar_ids) | set(popular_ids) | set(test_ids))
+    users = {
+        u["user_id"]: u
+        for u in await db["users"].find({"user_id": {"$in": candidate_ids}}, SIMILAR_PROJECTION).to_list(None)
+    }
+
+    scores = await current_profile_scores(users[uid] for _, uid, _ in matched_ids if uid in users)
+    matched_raw = [(score, user) for score, user, _ in rank_matches(my_tags, matched_ids, users, scores)]
+    similar_raw = rank_similar(my_tags, my_sketch, [users[uid] for uid in similar_ids if uid in users])
+    popular_raw = [users[uid] for uid in popular_ids if uid in users]
+    test_unique = [users[uid] for uid in test_ids if uid in users]
+
+    # --- Hydrate all four pools (one batched query pair per pool)
+    semaphore = asyncio.Semaphore(HYDRATION_CONCURRENCY)
+    matched_docs, similar_docs, popular_docs, test_docs = await asyncio.gather(
+        hydrate_story_documents(db, [o for _, o in matched_raw], user_id, semaphore),
+        hydrate_story_documents(db, [o for _, o in similar_raw], user_id, semaphore),
+        hydrate_story_documents(db, popular_raw, user_id, semaphore),
+        hydrate_story_documents(db, test_unique, user_id, semaphore),
+    )
+
+    matched = [(score, sd) for (score, _), sd in zip(matched_raw, matched_docs) if sd]
+    matched.sort(key=lambda x: x[0], reverse=True)
+    matched = [sd for _, sd in matched]
+    similar = [sd for sd in similar_docs if sd]  # already best first
+    popular = [sd for sd in popular_docs if sd]
+    test = [sd for sd in test_docs if sd]
 
     # --- 4) Sample & combine
     m_cnt = min(int(RESPONSE_SIZE * MATCH_RATIO), len(matched))
+    m_sample = matched[:m_cnt]
+    # Similar users often also top the tag matches; take ones not already picked
+    picked = {sd.user.user_id for sd in m_sample}
+    s_sample = [sd for sd in similar if sd.user.user_id not in picked][:int(RESPONSE_SIZE * SIMILAR_RATIO)]
+    s_cnt = len(s_sample)
     p_cnt = min(int(RESPONSE_SIZE * POPULAR_RATIO), len(popular))
-    t_cnt = RESPONSE_SIZE - m_cnt - p_cnt
+    t_cnt = RESPONSE_SIZE - m_cnt - s_cnt - p_cnt
 
-    m_sample = matched[:m_cnt]
     p_sample = random.sample(popular, p_cnt) if p_cnt and len(popular) >= p_cnt else []
     t_sample = random.sample(test, t_cnt) if t_cnt and len(test) >= t_cnt else []
 
-    combined = m_sample + p_sample + t_sample
+    # One story document per user, whichever pool it came from
+    combined = list({sd.user.user_id: sd for sd in reversed(m_sample + s_sample + p_sample + t_sample)}.values())
 
     # --- 5) Fallback fill
     if len(combined) < RESPONSE_SIZE:
         leftovers = (
             matched[m_cnt:] +
+            [s for s in similar if s not in s_sample] +
             [p for p in popular if p not in p_sample] +
             [t for t in test if t not in t_sample]
         )
-        combined.extend(leftovers[:RESPONSE_SIZE - len(combined)])
+        seen = {sd.user.user_id for sd in combined}
+        for sd in leftovers:
+            if len(combined) >= RESPONSE_SIZE:
+                break
+            if sd.user.user_id not in seen:
+                seen.add(sd.user.user_id)
+                combined.append(sd)
 
     random.shuffle(combined)
     return combined[:RESPONSE_SIZE]
@@ -163,30 +259,20 @@ async def recommend_users_from_signature(db, signature: ProfileSignature) -> Lis
     tags = matching_tags(signature)
     if not tags:
         return []
-    query = {
-        "profile_signature": {"$exists": True},
-        "$or": [
-            {"profile_signature.behavioral_tags": {"$in": tags}},
-            {"profile_signature.interests": {"$in": tags}},
-            {"profile_signature.bio_tags": {"$in": tags}},
-            {"profile_signature.category": {"$in": tags}}
-        ]
+    matched = await find_matches(tags)
+    users = {
+        u["user_id"]: u
+        for u in await db.users.find(
+            {"user_id": {"$in": [uid for _, uid, _ in matched]}}, CANDIDATE_PROJECTION
+        ).to_list(None)
     }
-    users = await db.users.find(query).limit(100).to_list(100)
-    scored = []
-    for user in users:
-        other_sig = ProfileSignature(**user["profile_signature"])
-        other_tags = matching_tags(other_sig)
-        shared = set(tags) & set(other_tags)
-        if not shared:
-            continue
-        score = len(shared) * 5 + other_sig.profile_score
-        scored.append({
+    return [
+        {
             "user_id": user["user_id"],
-            "username": user.get("username"),
+            "username": user["username"],
             "profile_image_url": user.get("profile_image_url"),
             "score": score,
-            "reason": list(shared)
-        })
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:30]
+            "reason": shared
+        }
+        for score, user, shared in rank_matches(tags, matched, users, await current_profile_scores(users.values()))[:30]
+    ]
@@ -0,0 +1,179 @@
+"""
+Compact profile signatures: a user's tags and categories as a bitset over a fixed
+vocabulary (every category and keyword in CATEGORY_KEYWORDS), so candidates can be
+scored with integer AND + popcount instead of rebuilding ProfileSignature models
+and intersecting sets.
+
+Stored next to `profile_signature` on the user document:
+
+    signature_vector: {"version": VOCAB_VERSION, "bits": <packed little-endian bytes>}
+
+Tags outside the vocabulary (free-form interests) hash into HASHED_BITS extra
+buckets, so they still count towards overlap. A vector whose version differs from
+VOCAB_VERSION (the vocabulary changed) is treated as missing until it is re-encoded.
+The MinHash sketch (see minhash) is derived from the same tags and written with it
+by `signature_fields`; the candidate pool rebuild re-encodes outdated ones, or run
+from the `thebox` directory:
+    python -m routers.automations.recommendations.signature_vectors
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import zlib
+
+from pymongo import UpdateOne
+
+from routers.automations.recommendations.categories import CATEGORY_KEYWORDS
+from routers.automations.recommendations.minhash import MINHASH_FIELD, MINHASH_VERSION, minhash_doc
+
+VECTOR_FIELD = "signature_vector"
+HASHED_BITS  = 256
+SIGNATURE_SOURCES = ("behavioral_tags", "interests", "bio_tags", "category")
+
+VOCABULARY = sorted(
+    {category.casefold() for category in CATEGORY_KEYWORDS}
+    | {kw.casefold() for keywords in CATEGORY_KEYWORDS.values() for kw in keywords}
+)
+TAG_BITS = {tag: i for i, tag in enumerate(VOCABULARY)}
+VECTOR_BITS = len(VOCABULARY) + HASHED_BITS
+VECTOR_BYTES = (VECTOR_BITS + 7) // 8
+VOCAB_VERSION = zlib.crc32("\n".join(VOCABULARY).encode()) ^ HASHED_BITS
+
+
+def tag_bit(tag: str) -> int:
+    tag = tag.casefold()
+    bit = TAG_BITS.get(tag)
+    if bit is None:
+        bit = len(VOCABULARY) + zlib.crc32(tag.encode()) % HASHED_BITS
+    return bit
+
+
+def encode_tags(tags: Iterable[str]) -> int:
+    bits = 0
+    for tag in tags:
+        bits |= 1 << tag_bit(tag)
+    return bits
+
+
+def signature_tags(signature: dict) -> List[str]:
+    """Every tag and category on a stored signature dict (same sources as matching_tags)."""
+    return [tag for source in SIGNATURE_SOURCES for tag in signature.get(source) or []]
+
+
+def signature_vector(signature: dict) -> dict:
+    """The VECTOR_FIELD value for a signature dict."""
+    bits = encode_tags(signature_tags(signature or {}))
+    return {"version": VOCAB_VERSION, "bits": bits.to_bytes(VECTOR_BYTES, "little")}
+
+
+def signature_fields(signature: dict) -> dict:
+    """Every field derived from a signature dict, to $set next to it: the vector and the MinHash sketch."""
+    return {VECTOR_FIELD: signature_vector(signature), MINHASH_FIELD: minhash_doc(signature_tags(signature or {}))}
+
+
+def stored_bits(user: dict) -> Optional[int]:
+    """A user's bitset from their stored vector, or None if missing / from another vocabulary."""
+    vector = user.get(VECTOR_FIELD)
+    if not vector or vector.get("version") != VOCAB_VERSION:
+        return None
+    return int.from_bytes(vector["bits"], "little")
+
+
+def overlap_counts(query: int, candidates: Sequence[Optional[int]]) -> List[Optional[int]]:
+    """Shared tag count between `query` and every candidate bitset (None stays None)."""
+    return [None if c is None else (query & c).bit_count() for c in candidates]
+
+
+def score_candidates(tags: List[str], users: Sequence[dict]) -> List[Tuple[Optional[int], List[str]]]:
+    """
+    (shared tag count, shared tags) per user, aligned with `users`; (None, []) for
+    users without a current vector. Shared tags are read back from the viewer's own
+    `tags`, so the vocabulary never has to be decoded. Only vocabulary tags are
+    reported: a hashed bucket can be set by a different free-form tag, so those
+    still count towards the overlap but are never named as a reason.
+    """
+    query = encode_tags(tags)
+    vectors = [stored_bits(u) for u in users]
+    counts = overlap_counts(query, vectors)
+    tag_bits = [(tag, 1 << TAG_BITS[tag]) for tag in dict.fromkeys(t.casefold() for t in tags) if tag in TAG_BITS]
+    return [
+        (count, [tag for tag, bit in tag_bits if vector & bit] if count else [])
+        for count, vector in zip(counts, vectors)
+    ]
+
+
+def jaccard_similarities(tags: List[str], users: Sequence[dict]) -> List[Optional[float]]:
+    """Jaccard similarity of `tags` with every user's stored vector (None without a current vector)."""
+    query = encode_tags(tags)
+    return [
+        None if vector is None else (query & vector).bit_count() / ((query | vector).bit_count() or 1)
+        for vector in map(stored_bits, users)
+    ]
+
+
+def _is_stale(user: dict) -> bool:
+    # Users without tags have no sketch to keep current
+    return ((user.get(VECTOR_FIELD) or {}).get("version") != VOCAB_VERSION
+            or ((user.get(MINHASH_FIELD) or {}).get("version") != MINHASH_VERSION
+                and bool(signature_tags(user["profile_signature"]))))
+
+
+def stale_vector_ops(users: Iterable[dict]) -> List[UpdateOne]:
+    """Updates re-encoding every user (with a signature) whose vector or sketch is missing or outdated."""
+    return [
+        UpdateOne({"user_id": u["user_id"]}, {"$set": signature_fields(u["profile_signature"])})
+        for u in users
+        if u.get("profile_signature") and _is_stale(u)
+    ]
+
+
+async def refresh_signature_vectors(db, user_ids: Iterable[str]):
+    """Re-encode users' vectors and sketches from their stored signatures (after a profile edit)."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    users = await db.users.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "profile_signature": 1}).to_list(None)
+    ops = [UpdateOne({"user_id": u["user_id"]}, {"$set": signature_fields(u.get("profile_signature"))}) for u in users]
+    if ops:
+        await db.users.bulk_write(ops, ordered=False)
+
+
+async def backfill_signature_vectors(db, batch_size: int = 1000) -> int:
+    """Encode every missing or outdated vector and sketch; returns how many users were written."""
+    written, batch = 0, []
+    query = {"profile_signature": {"$exists": True}, "$or": [
+        {f"{VECTOR_FIELD}.version": {"$ne": VOCAB_VERSION}},
+        {f"{MINHASH_FIELD}.version": {"$ne": MINHASH_VERSION}},
+    ]}
+    async def write(users):
+        ops = stale_vector_ops(users)
+        if ops:
+            await db.users.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    async for user in db.users.find(query, {"user_id": 1, "profile_signature": 1}):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            written += await write(batch)
+            batch = []
+    return written + await write(batch)
+
+
+async def main():
+    import argparse
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="userdetails")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        written = await backfill_signature_vectors(client[args.db])
+        print(f"✅ Signature vectors and sketches written for {written} users (vocabulary {VOCAB_VERSION:08x}, {VECTOR_BYTES} bytes each)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
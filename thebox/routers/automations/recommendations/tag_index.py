@@ -0,0 +1,387 @@
+"""
+In-process inverted index for recommendation candidates: tag / category (and
+`loc:{location}`) -> sorted array of compact user ordinals, plus each ordinal's
+profile_score. Matches are ranked by SHARED_TAG_WEIGHT * shared tags + profile_score
+over every user sharing a tag, without a network round trip.
+
+Each worker keeps its own copy:
+- built by streaming `users` from Mongo, or loaded from TAG_INDEX_SNAPSHOT when the
+  snapshot is still consistent with the change stream (warm start, no rescan)
+- kept current from CHANGES_STREAM, which the candidate pool write paths append to
+  (signup, profile edits, learned behavioral tags, score flushes, deletions)
+- snapshotted every SNAPSHOT_INTERVAL seconds (atomic replace; workers on one host
+  share the file)
+
+Lookups are bounded: when the viewer's posting lists hold more than SCAN_LIMIT
+entries in total (popular tags), users are walked best profile_score first and
+the walk stops once nobody further down can make the top k, or after WALK_LIMIT
+users.
+
+Set TAG_INDEX_ENABLED=0 to skip it; recommendations then read the Redis pools only.
+"""
+from array import array
+from base64 import b64decode, b64encode
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain, islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import json
+import os
+import sys
+import time
+import zlib
+
+from redis.exceptions import ResponseError
+
+from db.redis_client import redis_client
+from routers.automations.recommendations.profile_scores import DEFAULT_PROFILE_SCORE
+from routers.automations.recommendations.signature_vectors import signature_tags
+
+TAG_INDEX_ENABLED = os.getenv("TAG_INDEX_ENABLED", "1") == "1"
+TAG_INDEX_SNAPSHOT = os.getenv("TAG_INDEX_SNAPSHOT", "tag_index.snapshot")
+SNAPSHOT_INTERVAL  = 15 * 60       # secs
+SNAPSHOT_FORMAT    = 1
+CHANGES_STREAM     = "tag_index:changes"
+CHANGES_MAX_LEN    = 100_000       # approximate trim; a worker further behind rescans
+CHANGES_BATCH      = 100
+BLOCK_MS           = 1000
+BUILD_BATCH        = 5000
+SCAN_LIMIT         = 50_000        # posting entries counted directly per lookup
+WALK_LIMIT         = 10_000        # users visited by a best-score-first walk
+RESORT_AFTER       = 10_000        # users re-scored since the last sort before sorting again
+GAP_CHECK_INTERVAL = 60            # secs
+LOCATION_KEY       = "loc:{}"
+USER_PROJECTION    = {"user_id": 1, "location": 1, "profile_signature": 1}
+
+
+def index_entry(user: dict) -> list:
+    """[user_id, index keys, profile_score]; keys are None for a user to drop."""
+    signature = user.get("profile_signature")
+    if not signature:
+        return [user["user_id"], None, 0]
+    keys = {t.casefold() for t in signature_tags(signature)}
+    location = signature.get("location") or user.get("location")
+    if location:
+        keys.add(LOCATION_KEY.format(location.casefold()))
+    return [user["user_id"], sorted(keys), signature.get("profile_score", DEFAULT_PROFILE_SCORE)]
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class TagIndex:
+    def __init__(self):
+        self.user_ids: List[Optional[str]] = []      # ordinal -> user_id (None once removed)
+        self.ordinals: Dict[str, int] = {}
+        self.scores = array("i")
+        self.postings: Dict[str, array] = {}          # key -> sorted ordinals
+        self.user_keys: Dict[int, Tuple[str, ...]] = {}
+        self.by_score = array("I")                   # ordinals, best profile_score first, as of the last sort
+        self.resorted: Set[int] = set()              # ordinals upserted since then (order unknown)
+        self.stream_id = "0-0"                       # last change applied
+        self.ready = False
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def upsert(self, user_id: str, keys: Optional[List[str]], score: int):
+        if keys is None:
+            self.remove(user_id)
+            return
+        ordinal = self.ordinals.get(user_id)
+        if ordinal is None:
+            ordinal = len(self.user_ids)
+            self.ordinals[user_id] = ordinal
+            self.user_ids.append(user_id)
+            self.scores.append(score)
+        self.scores[ordinal] = score
+        self.resorted.add(ordinal)
+        old, new = set(self.user_keys.get(ordinal, ())), set(keys)
+        for key in old - new:
+            self._discard(key, ordinal)
+        for key in new - old:
+            postings = self.postings.setdefault(key, array("I"))
+            # New users get the highest ordinal, so this is almost always an append
+            if not postings or postings[-1] < ordinal:
+                postings.append(ordinal)
+            else:
+                insort(postings, ordinal)
+        self.user_keys[ordinal] = tuple(keys)
+        self.dirty = True
+
+    def remove(self, user_id: str):
+        ordinal = self.ordinals.pop(user_id, None)
+        if ordinal is None:
+            return
+        for key in self.user_keys.pop(ordinal, ()):
+            self._discard(key, ordinal)
+        self.user_ids[ordinal] = None
+        self.resorted.discard(ordinal)
+        self.dirty = True
+
+    def _discard(self, key: str, ordinal: int):
+        postings = self.postings.get(key)
+        if postings is None:
+            return
+        i = bisect_left(postings, ordinal)
+        if i < len(postings) and postings[i] == ordinal:
+            del postings[i]
+        if not postings:
+            del self.postings[key]
+
+    def apply(self, entries: Iterable[list]):
+        for user_id, keys, score in entries:
+            self.upsert(user_id, keys, score)
+
+    def score_order(self) -> array:
+        """Live ordinals sorted best profile_score first (slow for big indexes: run it in a thread)."""
+        scores = self.scores
+        live = [o for o, uid in enumerate(self.user_ids) if uid is not None]
+        return array("I", sorted(live, key=scores.__getitem__, reverse=True))
+
+    def top_k(self, tags: List[str], k: int, weight: int,
+              exclude: Iterable[str] = ()) -> List[Tuple[float, str, List[str]]]:
+        """
+        Best `k` users sharing any of `tags`, as (score, user_id, shared tags) with
+        score = weight * len(shared) + profile_score: a union of the tags' posting
+        lists counted in one pass when they are short, a bounded best-score-first
+        walk (see _walk_by_score) when they are not, then a heap for the top k.
+        """
+        tags = list(dict.fromkeys(t.casefold() for t in tags))
+        lists = [postings for postings in map(self.postings.get, tags) if postings]
+        excluded = {self.ordinals.get(user_id) for user_id in exclude}
+        scores = self.scores
+
+        if sum(map(len, lists)) <= SCAN_LIMIT:
+            counts = Counter()
+            for postings in lists:
+                counts.update(postings)
+            for ordinal in excluded:
+                counts.pop(ordinal, None)
+            best = heapq.nlargest(k, counts.items(), key=lambda item: weight * item[1] + scores[item[0]])
+        else:
+            best = self._walk_by_score(set(tags), k, weight, excluded)
+
+        wanted = set(tags)
+        return [
+            (weight * count + scores[ordinal], self.user_ids[ordinal],
+             [key for key in self.user_keys[ordinal] if key in wanted])
+            for ordinal, count in best
+        ]
+
+    def _walk_by_score(self, wanted: set, k: int, weight: int, excluded: set) -> List[Tuple[int, int]]:
+        """
+        (ordinal, shared count) of the best `k`, visiting users best profile_score
+        first: stops once the next user could not beat the k-th best even sharing
+        every tag, or after WALK_LIMIT users (then approximate). Users re-scored
+        since the last sort are not in score order and are always visited.
+        """
+        scores, user_keys, user_ids, resorted = self.scores, self.user_keys, self.user_ids, self.resorted
+        heap: List[Tuple[int, int, int]] = []    # (score, ordinal, count), k best so far
+        ceiling = weight * len(wanted)
+        walk = islice((o for o in self.by_score if o not in resorted and user_ids[o] is not None), WALK_LIMIT)
+
+        for ordinal in chain(resorted, walk):
+            score = scores[ordinal]
+            if len(heap) == k:
+                if score + ceiling <= heap[0][0]:
+                    if ordinal in resorted:
+                        continue
+                    break  # nobody further down the walk can make the top k
+            count = len(wanted.intersection(user_keys[ordinal]))
+            if count and ordinal not in excluded:
+                item = (weight * count + score, ordinal, count)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        return [(ordinal, count) for _, ordinal, count in sorted(heap, reverse=True)]
+
+    # ------------------ Snapshots ------------------ #
+
+    def snapshot_payload(self) -> tuple:
+        """Copies of the index state, cheap enough to take on the event loop."""
+        return (self.stream_id, list(self.user_ids), self.scores.tobytes(),
+                {key: postings.tobytes() for key, postings in self.postings.items()})
+
+    @staticmethod
+    def write_snapshot(payload: tuple, path: str = TAG_INDEX_SNAPSHOT):
+        stream_id, user_ids, scores, postings = payload
+        document = {
+            "format": SNAPSHOT_FORMAT,
+            "byteorder": sys.byteorder,
+            "stream_id": stream_id,
+            "user_ids": user_ids,
+            "scores": b64encode(scores).decode(),
+            "postings": {key: b64encode(raw).decode() for key, raw in postings.items()},
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(json.dumps(document).encode(), 1))
+        os.replace(tmp, path)
+
+    @classmethod
+    def read_snapshot(cls, path: str = TAG_INDEX_SNAPSHOT) -> Optional["TagIndex"]:
+        """The index stored at `path`, or None if it is missing or in another format."""
+        try:
+            with open(path, "rb") as f:
+                document = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if document.get("format") != SNAPSHOT_FORMAT:
+            return None
+
+        def load(raw: str, typecode: str) -> array:
+            values = array(typecode, b64decode(raw))
+            if document["byteorder"] != sys.byteorder:
+                values.byteswap()
+            return values
+
+        index = cls()
+        index.stream_id = document["stream_id"]
+        index.user_ids = document["user_ids"]
+        index.ordinals = {uid: o for o, uid in enumerate(index.user_ids) if uid is not None}
+        index.scores = load(document["scores"], "i")
+        # Users with a signature but no tags are in no posting list and still live
+        keys_by_ordinal: Dict[int, List[str]] = {o: [] for o in index.ordinals.values()}
+        for key, raw in document["postings"].items():
+            postings = load(raw, "I")
+            index.postings[key] = postings
+            for ordinal in postings:
+                keys_by_ordinal.setdefault(ordinal, []).append(key)
+        index.user_keys = {o: tuple(sorted(keys)) for o, keys in keys_by_ordinal.items()}
+        return index
+
+
+TAG_INDEX = TagIndex()
+
+
+# ------------------ Change stream ------------------ #
+
+def queue_index_changes(pipe, users: List[dict]):
+    """Add an XADD of these users' index entries to a (pool sync) pipeline."""
+    if TAG_INDEX_ENABLED and users:
+        pipe.xadd(CHANGES_STREAM, {"entries": json.dumps([index_entry(u) for u in users])},
+                  maxlen=CHANGES_MAX_LEN, approximate=True)
+
+
+def queue_index_removal(pipe, user_id: str):
+    if TAG_INDEX_ENABLED:
+        pipe.xadd(CHANGES_STREAM, {"entries": json.dumps([[user_id, None, 0]])},
+                  maxlen=CHANGES_MAX_LEN, approximate=True)
+
+
+async def _last_stream_id() -> str:
+    try:
+        info = await redis_client.xinfo_stream(CHANGES_STREAM)
+    except ResponseError:
+        return "0-0"  # no stream yet
+    return info["last-generated-id"]
+
+
+async def _changes_lost_since(stream_id: str) -> bool:
+    """True if entries after `stream_id` were trimmed before this worker read them."""
+    try:
+        info = await redis_client.xinfo_stream(CHANGES_STREAM)
+    except ResponseError:
+        return stream_id != "0-0"  # stream deleted
+    deleted = info.get("max-deleted-entry-id")  # Redis >= 7.0
+    if deleted is not None:
+        return _stream_id(deleted) > _stream_id(stream_id)
+    first = info.get("first-entry")
+    return bool(first) and _stream_id(first[0]) > _stream_id(stream_id)
+
+
+async def build_tag_index(db) -> TagIndex:
+    """Stream every user with a signature from Mongo into a new index."""
+    index = TagIndex()
+    # Changes from here on are replayed afterwards, so nothing written during the scan is lost
+    index.stream_id = await _last_stream_id()
+    async for user in db.users.find({"profile_signature": {"$exists": True}}, USER_PROJECTION, batch_size=BUILD_BATCH):
+        index.upsert(*index_entry(user))
+        if len(index) % BUILD_BATCH == 0:
+            await asyncio.sleep(0)  # keep serving requests during the scan
+    index.dirty = True
+    return index
+
+
+async def _load_or_build(db) -> TagIndex:
+    started = time.perf_counter()
+    index = await asyncio.to_thread(TagIndex.read_snapshot)
+    if index is not None and not await _changes_lost_since(index.stream_id):
+        print(f"✅ Tag index loaded from snapshot: {len(index)} users in {time.perf_counter() - started:.1f}s")
+        index.dirty = False
+        return index
+    index = await build_tag_index(db)
+    print(f"✅ Tag index built from Mongo: {len(index)} users in {time.perf_counter() - started:.1f}s")
+    return index
+
+
+async def _catch_up(index: TagIndex, block: Optional[int] = None) -> int:
+    """Apply the next batch of changes; returns how many messages were read."""
+    resp = await redis_client.xread({CHANGES_STREAM: index.stream_id}, count=CHANGES_BATCH, block=block)
+    read = 0
+    for _, messages in resp or []:
+        for message_id, fields in messages:
+            index.apply(json.loads(fields["entries"]))
+            index.stream_id = message_id
+            read += 1
+    return read
+
+
+async def _resort(index: TagIndex):
+    # Only run_tag_index mutates the index, so the thread sorts a stable state
+    index.by_score = await asyncio.to_thread(index.score_order)
+    index.resorted = set()
+
+
+async def run_tag_index(db):
+    """
+    Background task: load or build this worker's TAG_INDEX, then apply the change
+    stream and write snapshots. A gap in the stream (trimmed before it was read),
+    checked after every load or build, every GAP_CHECK_INTERVAL seconds and after
+    errors, triggers a rebuild; until the index is ready, callers use the Redis pools.
+    """
+    global TAG_INDEX
+    last_snapshot = last_gap_check = time.monotonic()
+    while True:
+        try:
+            if not TAG_INDEX.ready:
+                index = await _load_or_build(db)
+                while await _changes_lost_since(index.stream_id):
+                    print("⚠️ Tag index changes were trimmed during the build; rebuilding")
+                    index = await build_tag_index(db)
+                while await _catch_up(index):
+                    await asyncio.sleep(0)
+                await _resort(index)
+                index.ready = True
+                TAG_INDEX = index
+                last_gap_check = time.monotonic()
+
+            await _catch_up(TAG_INDEX, block=BLOCK_MS)
+            if len(TAG_INDEX.resorted) > RESORT_AFTER:
+                await _resort(TAG_INDEX)
+
+            if time.monotonic() - last_gap_check >= GAP_CHECK_INTERVAL:
+                last_gap_check = time.monotonic()
+                if await _changes_lost_since(TAG_INDEX.stream_id):
+                    print("⚠️ Tag index fell behind the trimmed change stream; rebuilding")
+                    TAG_INDEX.ready = False
+                    continue
+
+            if TAG_INDEX.dirty and time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                payload = TAG_INDEX.snapshot_payload()
+                TAG_INDEX.dirty = False
+                last_snapshot = time.monotonic()
+                await asyncio.to_thread(TagIndex.write_snapshot, payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Tag index error: {e}")
+            last_gap_check = 0  # check on the next pass
+            await asyncio.sleep(1)
@@ -0,0 +1,168 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Tuple
+from uuid import uuid4
+import asyncio
+import hashlib
+import os
+
+import aiofiles
+from pymongo import ReturnDocument
+from fastapi import HTTPException, UploadFile
+
+from db.redis_client import redis_client
+
+MEDIA_DIR = "media"
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+MEDIA_LOCK_KEY = "media:lock:{}"
+MEDIA_LOCK_TTL_MS = 60 * 1000
+MEDIA_LOCK_POLL = 0.05      # secs
+
+# Upper bound per story content type, enforced while streaming
+MAX_UPLOAD_SIZES = {
+    "image": 20 * 1024 * 1024,
+    "video": 500 * 1024 * 1024,
+    "audio": 50 * 1024 * 1024,
+}
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {max_size // (1024 * 1024)} MB).")
+
+
+async def stream_upload_to_disk(file: UploadFile, dest_path: str, max_size: int) -> Tuple[str, int]:
+    """
+    Copy an upload to `dest_path` in CHUNK_SIZE pieces, hashing as it goes.
+
+    Data goes to a temporary file next to the destination, which is renamed into
+    place only once the whole upload has been received, so readers never see a
+    partial file. Raises 413 as soon as the upload exceeds `max_size`.
+    Returns (sha256 hex digest, size in bytes).
+    """
+    tmp_path = os.path.join(os.path.dirname(dest_path), f".{uuid4()}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out_file:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise _too_large(max_size)
+                digest.update(chunk)
+                await out_file.write(chunk)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), size
+
+
+# ------------------ Content-addressed store ------------------ #
+#
+# Files are named by the SHA-256 of their bytes and sharded as media/ab/cd/<digest><ext>.
+# `media_blobs` holds one document per digest with a reference count, so the same
+# clip uploaded or reposted many times is stored (and written) once. Storing and
+# releasing one digest is serialized across workers by a Redis lock, so a release
+# never removes a file that a concurrent upload of the same bytes just wrote.
+
+def media_name(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+@asynccontextmanager
+async def _digest_lock(digest: str):
+    key, token = MEDIA_LOCK_KEY.format(digest), str(uuid4())
+    while not await redis_client.set(key, token, nx=True, px=MEDIA_LOCK_TTL_MS):
+        await asyncio.sleep(MEDIA_LOCK_POLL)
+    try:
+        yield
+    finally:
+        if await redis_client.get(key) == token:
+            await redis_client.delete(key)
+
+
+async def _hash_upload(file: UploadFile, max_size: int) -> Tuple[str, int]:
+    """
+    Hash an upload without writing it anywhere. The request body is already spooled
+    by the server, so this is a read-only pass; the file is rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise _too_large(max_size)
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def store_media(db, file: UploadFile, content_type: str, max_size: int) -> str:
+    """
+    Store an upload in the content-addressed media store and return its name
+    (path relative to MEDIA_DIR). Idempotent: uploading bytes that are already
+    stored only bumps their reference count and skips the disk write.
+    """
+    digest, size = await _hash_upload(file, max_size)
+
+    async with _digest_lock(digest):
+        existing = await db.media_blobs.find_one_and_update({"_id": digest}, {"$inc": {"refs": 1}})
+        if existing and os.path.exists(os.path.join(MEDIA_DIR, existing["name"])):
+            return existing["name"]
+
+        name = existing["name"] if existing else media_name(digest, os.path.splitext(file.filename or "")[1])
+        path = os.path.join(MEDIA_DIR, name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            written_digest, _ = await stream_upload_to_disk(file, path, max_size)
+            if written_digest != digest:
+                os.remove(path)
+                raise HTTPException(status_code=400, detail="Upload changed while it was being stored.")
+        except BaseException:
+            if existing:
+                # Undo the reference taken above: this upload stored nothing
+                await db.media_blobs.update_one({"_id": digest}, {"$inc": {"refs": -1}})
+            raise
+
+        if not existing:
+            await db.media_blobs.update_one(
+                {"_id": digest},
+                {
+                    "$inc": {"refs": 1},
+                    "$setOnInsert": {
+                        "name": name,
+                        "size": size,
+                        "content_type": content_type,
+                        "created_at": datetime.utcnow()
+                    }
+                },
+                upsert=True
+            )
+        return name
+
+
+async def release_media(db, name: str):
+    """
+    Drop one reference to a stored file; the file is removed with its last reference.
+    Names from before the content-addressed store (no blob record) are deleted directly.
+    """
+    digest = os.path.splitext(os.path.basename(name))[0]
+    async with _digest_lock(digest):
+        blob = await db.media_blobs.find_one_and_update(
+            {"_id": digest, "name": name},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            path = os.path.join(MEDIA_DIR, name)
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        if blob["refs"] <= 0:
+            # Only the request that actually deletes the record removes the file
+            result = await db.media_blobs.delete_one({"_id": digest, "refs": {"$lte": 0}})
+            path = os.path.join(MEDIA_DIR, name)
+            if result.deleted_count and os.path.exists(path):
+                os.remove(path)
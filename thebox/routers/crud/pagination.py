@@ -0,0 +1,88 @@
+"""
+Keyset pagination: pages are `_id > last_id` range scans on the _id index (or,
+with a sort field, `(field, _id)` past the last page's pair on a compound index),
+so every page costs the same no matter how deep it is (unlike skip/limit, which
+walks over every skipped document).
+
+The continuation token is opaque to clients: urlsafe base64 of the last _id
+(and sort field value).
+"""
+from datetime import datetime
+import base64
+import json
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 100
+
+
+def _encode_value(value) -> list:
+    if isinstance(value, ObjectId):
+        return ["oid", str(value)]
+    if isinstance(value, datetime):
+        return ["date", value.isoformat()]
+    return ["str", str(value)]
+
+
+def _decode_value(pair):
+    kind, value = pair
+    if kind == "oid":
+        return ObjectId(value)
+    if kind == "date":
+        return datetime.fromisoformat(value)
+    return str(value)
+
+
+def encode_cursor(last_id, sort_value=None) -> str:
+    payload = _encode_value(last_id) if sort_value is None else [_encode_value(sort_value), _encode_value(last_id)]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str):
+    """The last _id, or (sort value, last _id) for cursors from a sorted page."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if isinstance(payload[0], list):
+            return tuple(map(_decode_value, payload))
+        return _decode_value(payload)
+    except (ValueError, TypeError, IndexError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+async def fetch_page(collection, query: dict, limit: int, skip: int = 0,
+                     cursor: Optional[str] = None, projection: Optional[dict] = None,
+                     sort_field: Optional[str] = None, descending: bool = False) -> Tuple[list, Optional[str]]:
+    """
+    One page of `query` in _id order, or in (sort_field, _id) order when given (needs
+    an index ending in those two), plus the token for the next page (None on the last page).
+    A cursor takes precedence over `skip`, which is only kept for older clients.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    direction, past = (-1, "$lt") if descending else (1, "$gt")
+    if cursor:
+        last = decode_cursor(cursor)
+        if sort_field:
+            if not isinstance(last, tuple):
+                raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+            value, last_id = last
+            query = {"$and": [query, {"$or": [
+                {sort_field: {past: value}},
+                {sort_field: value, "_id": {past: last_id}},
+            ]}]}
+        else:
+            query = {**query, "_id": {past: last}}
+        skip = 0
+
+    sort = [(sort_field, direction), ("_id", direction)] if sort_field else [("_id", direction)]
+    # One extra document tells us whether there is a next page
+    docs = await collection.find(query, projection).sort(sort).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last["_id"], last[sort_field] if sort_field else None)
@@ -2,20 +2,26 @@ from pydantic import HttpUrl
 from db.models.stories import Story, StoryInput
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import UpdateOne
 from fastapi import HTTPException, FastAPI, Request, UploadFile
 from typing import Any, List, Optional
 from db.models.stories import UserPreview
 from datetime import datetime
 import os
-import aiofiles
 import json
 from uuid import uuid4
 
-from db.redis_client import STORY_CACHE_TTL, delete_cache, get_cache, set_cache
+from db.redis_client import STORY_CACHE_TTL, delete_cache, get_or_load
+from routers.crud.view_stats import delete_view_stats, record_story_views
+from routers.crud.pagination import fetch_page
+from routers.crud.media import MAX_UPLOAD_SIZES, MEDIA_DIR, release_media, store_media
 
-MEDIA_DIR = "media"
 os.makedirs(MEDIA_DIR, exist_ok=True)
 
+# Engagement is stored one record per event in `story_engagement`
+# (kind = one of these), with a matching counter in `stories.$.counts`
+ENGAGEMENT_KINDS = ("views", "reactions", "reposts", "shares")
+
 
 def convert_httpurls_to_str(data: Any):
     if isinstance(data, dict):
@@ -61,13 +67,8 @@ async def create_media_story(db, request: Request, current_user: dict, file: Upl
     else:
         raise HTTPException(status_code=400, detail="Unsupported media type.")
 
-    # 2. Save file to disk
-    ext = os.path.splitext(file.filename)[1]
-    unique_name = f"{uuid4()}{ext}"
-    save_path = os.path.join(MEDIA_DIR, unique_name)
-
-    async with aiofiles.open(save_path, "wb") as out_file:
-        await out_file.write(await file.read())
+    # 2. Save file to the content-addressed store (no-op write for duplicates)
+    unique_name = await store_media(db, file, content_type, MAX_UPLOAD_SIZES[content_type])
 
     # 3. Build full URL (assuming localhost:8000)
     scheme = request.url.scheme
@@ -101,10 +102,7 @@ async def _insert_story_to_db(db, story: Story):
     new_story_data = {
         "story_id": story.story_id,
         "details": story_dict["details"],
-        "views": [],
-        "reactions": [],
-        "reposts": [],
-        "shares": []
+        "counts": story_dict["counts"]
     }
 
     await db.stories.update_one(
@@ -123,32 +121,26 @@ async def _insert_story_to_db(db, story: Story):
     }
 
     
-async def get_all_stories(db, skip: int = 0, limit: int = 10):
-    cursor = db.stories.find().skip(skip).limit(limit)
-    stories = await cursor.to_list(length=limit)
+async def get_all_stories(db, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    """(page of story documents, token for the next page or None)."""
+    stories, next_cursor = await fetch_page(db.stories, {}, limit, skip=skip, cursor=cursor)
     for story in stories:
         story["_id"] = str(story["_id"])
-    return stories
+    return stories, next_cursor
 
 async def get_stories_by_user_id(db, user_id: str):
     cache_key = f"stories:{user_id}"
 
-    # 1. Redis check
-    cached = await get_cache(cache_key)
-    if cached:
-        print("✅ Returned from Redis cache")
-        return cached
+    # Redis check, DB fallback on a miss (coalesced across concurrent requests)
+    async def load():
+        doc = await db.stories.find_one({"user.user_id": user_id})
+        if not doc:
+            raise HTTPException(status_code=404, detail="User has no stories")
 
-    # 2. DB fallback
-    doc = await db.stories.find_one({"user.user_id": user_id})
-    if not doc:
-        raise HTTPException(status_code=404, detail="User has no stories")
+        doc["_id"] = str(doc["_id"])
+        return doc
 
-    doc["_id"] = str(doc["_id"])
-
-    # 3. Cache & return
-    await set_cache(cache_key, doc, ttl=STORY_CACHE_TTL)
-    return doc
+    return await get_or_load(cache_key, load, ttl=STORY_CACHE_TTL)
 
 
 
@@ -174,7 +166,7 @@ async def update_story(db, story_id: str, user_id: str, update_data: dict):
 
 
 async def delete_story(db, story_id: str, user_id: str):
-    doc = await db.stories.find_one({"_id": user_id})
+    doc = await db.stories.find_one({"_id": user_id}, {"stories": {"$elemMatch": {"story_id": story_id}}})
     if not doc:
         raise HTTPException(status_code=404, detail="User or story not found.")
 
@@ -183,14 +175,6 @@ async def delete_story(db, story_id: str, user_id: str):
     if not entry:
         raise HTTPException(status_code=404, detail="Story not found or unauthorized.")
 
-    # If media file exists, delete it
-    details = entry.get("details", {})
-    if details.get("content_url"):
-        filename = details["content_url"].split("/media/")[-1]
-        path = os.path.join(MEDIA_DIR, filename)
-        if os.path.exists(path):
-            os.remove(path)
-
     # Remove from array
     result = await db.stories.update_one(
         {"_id": user_id},
@@ -203,34 +187,87 @@ async def delete_story(db, story_id: str, user_id: str):
         {"user_id": user_id},
         {"$pull": {"stories": {"story_id": story_id}}}
     )
+    await db.story_engagement.delete_many({"story_id": story_id})
+    await delete_view_stats(db, user_id, [story_id])
+
+    # Drop this story's reference to its media (file goes with the last one)
+    details = entry.get("details", {})
+    if details.get("content_url"):
+        await release_media(db, details["content_url"].split("/media/")[-1])
 
     await delete_cache(f"stories:{user_id}")
     return {"message": "Story (and media) deleted successfully ✅"}
 
 
-async def track_story_view(db: AsyncIOMotorClient, viewer_id: str, target_id: str, story_id: str):
+async def record_engagement(db, owner_id: str, story_id: str, kind: str, record: dict):
     """
-    Record that viewer_id saw story_id under target_id.
-    Also update target's ViewerLog.
+    Append one engagement record (reaction, repost, share) and bump the story's counter.
+    The story document itself never grows with engagement.
     """
-    # 1) WatchHistory
-    await db.user_views.update_one(
+    entry = {
+        "story_id": story_id,
+        "owner_id": owner_id,
+        "kind": kind,
+        "at": datetime.utcnow(),
+        **convert_httpurls_to_str(record)
+    }
+    await db.story_engagement.insert_one(entry)
+    await db.stories.update_one(
+        {"_id": owner_id, "stories.story_id": story_id},
+        {"$inc": {f"stories.$.counts.{kind}": 1}}
+    )
+
+
+async def get_story_engagement(db, story_id: str, kind: str, limit: int = 50, cursor: Optional[str] = None):
+    """(page of engagement records, newest first, token for the next page or None)."""
+    if kind not in ENGAGEMENT_KINDS:
+        raise HTTPException(status_code=400, detail="Unknown engagement kind")
+    records, next_cursor = await fetch_page(
+        db.story_engagement, {"story_id": story_id, "kind": kind}, limit, cursor=cursor,
+        sort_field="at", descending=True
+    )
+    for record in records:
+        del record["_id"]
+    return records, next_cursor
+
+
+def story_view_ops(viewer_id: str, target_id: str, story_id: str):
+    """
+    Upserts that record a view: (user_views op, viewer_logs op).
+    Shared by track_story_view and the batched interaction consumer.
+    """
+    now = datetime.utcnow()
+    watch = UpdateOne(
         {"viewer_id": viewer_id, "target_id": target_id},
         {
             "$addToSet": {"viewed_stories": story_id},
-            "$set": {"last_seen": datetime.utcnow()}
+            "$set": {"last_seen": now}
         },
         upsert=True
     )
-    # 2) ViewerLog
-    await db.viewer_logs.update_one(
+    log = UpdateOne(
         {"target_id": target_id},
         {
             "$addToSet": {"viewers": viewer_id},
-            "$set": {"last_updated": datetime.utcnow()}
+            "$set": {"last_updated": now}
         },
         upsert=True
     )
+    return watch, log
+
+
+async def track_story_view(db: AsyncIOMotorClient, viewer_id: str, target_id: str, story_id: str):
+    """
+    Record that viewer_id saw story_id under target_id.
+    Also update target's ViewerLog.
+    """
+    watch, log = story_view_ops(viewer_id, target_id, story_id)
+    # 1) WatchHistory
+    await db.user_views.bulk_write([watch])
+    # 2) ViewerLog
+    await db.viewer_logs.bulk_write([log])
+    # 3) View counters / unique viewers
+    await record_story_views([(viewer_id, target_id, story_id)])
 
 async def load_seen_map(db: AsyncIOMotorClient, viewer_id: str) -> dict:
     """
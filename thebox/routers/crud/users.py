@@ -7,27 +7,26 @@ from jwt.exceptions import InvalidTokenError
 from bson import ObjectId
 from fastapi import HTTPException, FastAPI
 from bson.errors import InvalidId
-from typing import List
-from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
 from datetime import datetime
 
-from db.redis_client import PROFILE_CACHE_TTL, delete_cache, get_cache, set_cache
+from db.redis_client import PROFILE_CACHE_TTL, delete_cache, get_cache_many, set_cache_many
+from routers.automations.recommendations.candidate_pools import refresh_user_pools, remove_user_pools, sync_user_pools
+from routers.automations.recommendations.signature_vectors import refresh_signature_vectors, signature_fields
+from routers.crud.media import release_media
+from routers.crud.pagination import fetch_page
+from routers.crud.view_stats import delete_view_stats
+from security.passwords import hash_password, verify_password
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+DUPLICATE_USER_MESSAGES = {
+    "email": "Email already registered",
+    "username": "Username already taken",
+}
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 async def create_user(db: AsyncIOMotorClient, user: UserModel):
-    # Duplicate check
-    if await db.users.find_one({"email": user.email}):
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    if await db.users.find_one({"username": user.username}):
-        raise HTTPException(status_code=400, detail="Username already taken")
-
     user_dict = user.model_dump()
     
     # Convert URLs to string
@@ -38,12 +37,30 @@ async def create_user(db: AsyncIOMotorClient, user: UserModel):
         if story.get("thumbnail_url"):
             story["thumbnail_url"] = str(story["thumbnail_url"])
 
+    # Cheap duplicate check (indexed) before paying for the bcrypt hash
+    existing = await db.users.find_one(
+        {"$or": [{"email": user_dict["email"]}, {"username": user_dict["username"]}]},
+        {"email": 1}
+    )
+    if existing:
+        field = "email" if existing.get("email") == user_dict["email"] else "username"
+        raise HTTPException(status_code=400, detail=DUPLICATE_USER_MESSAGES[field])
+
     # Hash password
-    user_dict["password"] = pwd_context.hash(user_dict["password"])
+    user_dict["password"] = await hash_password(user_dict["password"])
 
     user_dict["_id"] = user_dict["user_id"]
+    user_dict.update(signature_fields(user_dict["profile_signature"]))
     
-    await db.users.insert_one(user_dict)
+    # Concurrent sign-ups can both pass the check: the unique indexes in db.indexes
+    # still reject the second one atomically
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        field = next(iter((e.details or {}).get("keyPattern", {})), None)
+        raise HTTPException(status_code=400, detail=DUPLICATE_USER_MESSAGES.get(field, "User already exists"))
+
+    await sync_user_pools([user_dict])
 
     return {"message": "User created successfully", "user_id": user.user_id}
 
@@ -52,7 +69,7 @@ async def login_user(db, email: str, password: str):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not verify_password(password, user["password"]):
+    if not await verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Incorrect password")
 
     return {
@@ -73,50 +90,61 @@ async def remove_refresh_token(db, user_id: str):
 
 
 # GET SINGLE USER
-from db.redis_client import get_cache, set_cache, PROFILE_CACHE_TTL
+from db.redis_client import get_or_load, PROFILE_CACHE_TTL
 from fastapi import HTTPException
 
-async def get_user_by_id(db, user_id: str) -> dict:
-    # 1️⃣ Check Redis cache first
-    cached = await get_cache(f"user:{user_id}")
-    if cached:
-        print("🟢 Returned from Redis cache")
-        return cached
-
-    # 2️⃣ If not in cache → Fetch from DB
-    print("🧠 Fetched from MongoDB")
-    user = await db.users.find_one({"_id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+USER_PREVIEW_PROJECTION = {"username": 1, "profile_image_url": 1}
+MAX_BATCH_USERS = 100
+
 
-    user_data = {
+def _user_preview(user: dict) -> dict:
+    return {
         "user_id": user["_id"],
         "username": user["username"],
         "profile_image_url": user.get("profile_image_url"),
     }
 
-    # 3️⃣ Cache it for future requests
-    await set_cache(f"user:{user_id}", user_data, ttl=PROFILE_CACHE_TTL)
 
-    return user_data
+async def get_user_by_id(db, user_id: str) -> dict:
+    # Redis (or this worker's local tier) first; concurrent misses share one Mongo read
+    async def load():
+        user = await db.users.find_one({"_id": user_id}, USER_PREVIEW_PROJECTION)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
+        return _user_preview(user)
 
+    return await get_or_load(f"user:{user_id}", load, ttl=PROFILE_CACHE_TTL)
 
-# GET ALL USERS (with pagination & safety cap)
-async def get_all_users(db, skip: int = 0, limit: int = 10) -> list[dict]:
-    limit = min(limit, 100)  # Max 100 per request
 
-    cursor = db.users.find().skip(skip).limit(limit)
-    users = await cursor.to_list(length=limit)
-    
-    return [
-        {
-            "user_id": user["_id"],
-            "username": user["username"],
-            "profile_image_url": user.get("profile_image_url")
-        }
-        for user in users
-    ]
+async def get_users_by_ids(db, user_ids: List[str]) -> List[Optional[dict]]:
+    """
+    Previews for `user_ids` in the same order, None where the user does not exist.
+    One MGET for the cache, one `$in` query for the misses, one pipelined backfill.
+    """
+    unique_ids = list(dict.fromkeys(user_ids))
+    cached = await get_cache_many([f"user:{uid}" for uid in unique_ids])
+    found = {uid: preview for uid, preview in zip(unique_ids, cached) if preview is not None}
+
+    misses = [uid for uid in unique_ids if uid not in found]
+    if misses:
+        loaded = {}
+        async for user in db.users.find({"_id": {"$in": misses}}, USER_PREVIEW_PROJECTION):
+            loaded[user["_id"]] = _user_preview(user)
+        found.update(loaded)
+        await set_cache_many({f"user:{uid}": preview for uid, preview in loaded.items()}, ttl=PROFILE_CACHE_TTL)
+
+    return [found.get(uid) for uid in user_ids]
+
+
+
+# GET ALL USERS (keyset pagination; skip kept for older clients)
+async def get_all_users(db, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    """(page of previews, token for the next page or None)."""
+    users, next_cursor = await fetch_page(
+        db.users, {}, limit, skip=skip, cursor=cursor, projection=USER_PREVIEW_PROJECTION
+    )
+    return [_user_preview(user) for user in users], next_cursor
     
     
 async def update_user_profile(db, user_id: str, update_data: dict):
@@ -135,6 +163,9 @@ async def update_user_profile(db, user_id: str, update_data: dict):
         raise HTTPException(status_code=404, detail="User not found or no change")
     
     await delete_cache(f"user:{user_id}")
+    if any(key.startswith("profile_signature") for key in update_data):
+        await refresh_signature_vectors(db, [user_id])
+    await refresh_user_pools(db, [user_id])
 
     return {"message": "User updated successfully"}
 
@@ -146,7 +177,18 @@ async def delete_user_account(db, user_id: str):
         raise HTTPException(status_code=404, detail="User not found")
 
     # Optional: remove their stories too
+    doc = await db.stories.find_one({"_id": user_id}, {"stories.story_id": 1, "stories.details.content_url": 1})
+    stories = (doc or {}).get("stories", [])
+    story_ids = [s["story_id"] for s in stories]
+    # Drop each story's reference to its media, as delete_story does
+    for story in stories:
+        content_url = story.get("details", {}).get("content_url")
+        if content_url:
+            await release_media(db, content_url.split("/media/")[-1])
     await db.stories.delete_many({"user.user_id": user_id})
+    await db.story_engagement.delete_many({"owner_id": user_id})
+    await delete_view_stats(db, user_id, story_ids, owner=True)
     await delete_cache(f"user:{user_id}")
+    await remove_user_pools(user_id)
 
     return {"message": "User and stories deleted successfully"}
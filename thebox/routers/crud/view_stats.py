@@ -0,0 +1,183 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+
+from pymongo import UpdateOne
+
+from db.redis_client import redis_client
+
+# Unique viewers are HyperLogLogs (PFADD/PFCOUNT, ~0.8% error, 12 KB max per key);
+# total views are plain counters. Both live in Redis and are snapshotted to the
+# `view_stats` collection (and the story's counts.views) every FLUSH_INTERVAL.
+# The keys and snapshots live as long as the story (or owner account) and are
+# deleted with it (see delete_view_stats); snapshots only ever grow ($max), so a
+# lost Redis key cannot wipe the durable counts.
+DIRTY_STORIES_KEY    = "views:dirty"      # "owner_id|story_id" members touched since last flush
+FLUSH_BATCH          = 1000
+FLUSH_INTERVAL       = 30                 # secs
+COUNTED_EVENT_KEY    = "views:counted:{}" # event ids whose view is in the totals
+COUNTED_EVENT_TTL    = 60 * 60 * 24       # secs
+
+# Count a view in the totals once per event: KEYS[1] is the event's marker, KEYS[2..]
+# the counters, ARGV[1] the marker TTL. (PFADD and SADD are idempotent already.)
+COUNT_ONCE_SCRIPT = redis_client.register_script("""
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    for i = 2, #KEYS do redis.call('INCR', KEYS[i]) end
+end
+""")
+
+
+def _story_hll(story_id: str) -> str:
+    return f"views:hll:story:{story_id}"
+
+def _story_total(story_id: str) -> str:
+    return f"views:total:story:{story_id}"
+
+def _owner_hll(owner_id: str) -> str:
+    return f"views:hll:owner:{owner_id}"
+
+def _owner_total(owner_id: str) -> str:
+    return f"views:total:owner:{owner_id}"
+
+
+async def record_story_views(views: List[Tuple[str, str, str]], event_ids: Optional[Sequence[str]] = None):
+    """
+    Count a batch of (viewer_id, owner_id, story_id) views in one pipeline. With
+    `event_ids` (aligned with `views`), a view whose event was already counted is
+    not added to the totals again.
+    """
+    if not views:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for i, (viewer_id, owner_id, story_id) in enumerate(views):
+            pipe.pfadd(_story_hll(story_id), viewer_id)
+            pipe.pfadd(_owner_hll(owner_id), viewer_id)
+            if event_ids is None:
+                pipe.incr(_story_total(story_id))
+                pipe.incr(_owner_total(owner_id))
+            else:
+                await COUNT_ONCE_SCRIPT(keys=[COUNTED_EVENT_KEY.format(event_ids[i]), _story_total(story_id),
+                                              _owner_total(owner_id)],
+                                        args=[COUNTED_EVENT_TTL], client=pipe)
+            pipe.sadd(DIRTY_STORIES_KEY, f"{owner_id}|{story_id}")
+        await pipe.execute()
+
+
+async def delete_view_stats(db, owner_id: str, story_ids: List[str], owner: bool = False):
+    """Drop the counters and snapshots of deleted stories, and with `owner` the owner's totals too."""
+    keys = [key for story_id in story_ids for key in (_story_hll(story_id), _story_total(story_id))]
+    snapshot_ids = [f"story:{story_id}" for story_id in story_ids]
+    if owner:
+        keys += [_owner_hll(owner_id), _owner_total(owner_id)]
+        snapshot_ids.append(f"owner:{owner_id}")
+    if not keys:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.delete(*keys)
+        if story_ids:
+            pipe.srem(DIRTY_STORIES_KEY, *[f"{owner_id}|{story_id}" for story_id in story_ids])
+        await pipe.execute()
+    await db.view_stats.delete_many({"_id": {"$in": snapshot_ids}})
+
+
+async def _read_counts(story_ids: List[str], owner_ids: List[str] = ()) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Live counters for stories and owners, read in one pipeline."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for story_id in story_ids:
+            pipe.pfcount(_story_hll(story_id))
+            pipe.get(_story_total(story_id))
+        for owner_id in owner_ids:
+            pipe.pfcount(_owner_hll(owner_id))
+            pipe.get(_owner_total(owner_id))
+        results = await pipe.execute()
+
+    counts = [
+        {"views": int(results[i + 1] or 0), "unique_viewers": results[i]}
+        for i in range(0, len(results), 2)
+    ]
+    return dict(zip(story_ids, counts)), dict(zip(owner_ids, counts[len(story_ids):]))
+
+
+async def flush_view_stats(db) -> int:
+    """Snapshot the counters of every story viewed since the last flush to Mongo."""
+    flushed = 0
+    while True:
+        members = await redis_client.spop(DIRTY_STORIES_KEY, FLUSH_BATCH)
+        if not members:
+            return flushed
+        pairs = [m.split("|", 1) for m in members]
+        story_ids = [story_id for _, story_id in pairs]
+        owner_ids = list({owner_id for owner_id, _ in pairs})
+        try:
+            counts, owner_counts = await _read_counts(story_ids, owner_ids)
+
+            now = datetime.utcnow()
+            stat_ops = [
+                UpdateOne(
+                    {"_id": f"story:{story_id}"},
+                    {"$set": {"owner_id": owner_id, "story_id": story_id, "updated_at": now},
+                     "$max": counts[story_id]},
+                    upsert=True
+                )
+                for owner_id, story_id in pairs
+            ] + [
+                UpdateOne(
+                    {"_id": f"owner:{owner_id}"},
+                    {"$set": {"owner_id": owner_id, "updated_at": now}, "$max": c},
+                    upsert=True
+                )
+                for owner_id, c in owner_counts.items()
+            ]
+            story_ops = [
+                UpdateOne(
+                    {"_id": owner_id, "stories.story_id": story_id},
+                    {"$max": {"stories.$.counts.views": counts[story_id]["views"]}}
+                )
+                for owner_id, story_id in pairs
+            ]
+            await db.view_stats.bulk_write(stat_ops, ordered=False)
+            await db.stories.bulk_write(story_ops, ordered=False)
+        except Exception:
+            # Put them back so the next flush retries
+            await redis_client.sadd(DIRTY_STORIES_KEY, *members)
+            raise
+        flushed += len(members)
+
+
+async def get_view_stats_for_user(db, user_id: str) -> dict:
+    """View totals and unique viewers for each of a user's stories, plus profile-wide totals."""
+    doc = await db.stories.find_one({"_id": user_id}, {"stories.story_id": 1})
+    story_ids = [s["story_id"] for s in (doc or {}).get("stories", [])]
+
+    counts, owner_counts = await _read_counts(story_ids, [user_id])
+    totals = owner_counts[user_id]
+
+    # Redis keys can be lost; fall back to the last durable snapshot
+    missing = [f"story:{sid}" for sid in story_ids if not counts[sid]["views"]]
+    if not totals["views"]:
+        missing.append(f"owner:{user_id}")
+    if missing:
+        async for snap in db.view_stats.find({"_id": {"$in": missing}}):
+            snap_counts = {"views": snap["views"], "unique_viewers": snap["unique_viewers"]}
+            if snap.get("story_id"):
+                counts[snap["story_id"]] = snap_counts
+            else:
+                totals = snap_counts
+
+    return {
+        "user_id": user_id,
+        **totals,
+        "stories": [{"story_id": sid, **counts[sid]} for sid in story_ids],
+    }
+
+
+async def run_view_stats_flusher(db):
+    """Background task: snapshot view counters to Mongo every FLUSH_INTERVAL seconds."""
+    while True:
+        try:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await flush_view_stats(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ View stats flush error: {e}")
@@ -0,0 +1,143 @@
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+import mimetypes
+import os
+import re
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from routers.crud.media import CHUNK_SIZE, MEDIA_DIR
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+# Content-addressed names (see crud/media.media_name) never change, so they can be cached forever
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = "public, max-age=3600"
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaFileResponse(Response):
+    """
+    Sends `length` bytes of a file starting at `offset`.
+
+    Uses the ASGI `http.response.zerocopysend` extension (sendfile) when the server
+    offers it, otherwise streams CHUNK_SIZE reads.
+    """
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int, headers: dict, send_body: bool = True):
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                })
+            return
+
+        remaining = self.length
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.offset)
+            while remaining:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+        if remaining:
+            await send({"type": "http.response.body", "body": b""})
+
+
+def _resolve(name: str) -> str:
+    root = os.path.realpath(MEDIA_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Media not found")
+    return path
+
+
+def _etag(name: str, st: os.stat_result) -> str:
+    match = CONTENT_ADDRESSED.match(name)
+    if match:
+        return f'"{match["digest"]}"'
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single `bytes=` range, None to send the whole file."""
+    if not header:
+        return None
+    match = RANGE_HEADER.match(header.strip())
+    if not match or not (match[1] or match[2]):
+        return None  # malformed or multi-range: ignore and send the whole file
+    if match[1]:
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        start = max(size - int(match[2]), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@router.api_route("/{name:path}", methods=["GET", "HEAD"])
+async def serve_media(name: str, request: Request):
+    path = _resolve(name)
+    st = os.stat(path)
+    etag = _etag(name, st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE if CONTENT_ADDRESSED.match(name) else DEFAULT_CACHE,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        byte_range = _parse_range(request.headers.get("range"), st.st_size)
+
+    send_body = request.method != "HEAD"
+    if byte_range is None:
+        headers["Content-Length"] = str(st.st_size)
+        return MediaFileResponse(path, 0, st.st_size, 200, headers, send_body)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return MediaFileResponse(path, start, end - start + 1, 206, headers, send_body)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from db.mongo_monitoring import render_mongo_metrics
+from db.redis_client import cache_counters, local_cache
+from monitoring.metrics import render_http, render_samples, render_value
+from security.token_cache import TOKEN_CACHE
+
+router = APIRouter(tags=["Metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_cache_metrics(lines: list):
+    lookups = {
+        ("local", "hit"): cache_counters["local_hits"],
+        ("redis", "hit"): cache_counters["redis_hits"],
+        ("redis", "miss"): cache_counters["misses"],
+    }
+    render_samples(lines, "cache_lookups_total", "counter", "Cache lookups by tier and result.", ("tier", "result"), lookups)
+    render_value(lines, "cache_loads_total", "counter", "Loader calls made on cache misses (after coalescing).", cache_counters["loads"])
+    render_value(lines, "cache_invalidations_total", "counter", "Invalidations received from other workers.", cache_counters["invalidations"])
+    render_value(lines, "cache_decode_errors_total", "counter", "Cached values in an unknown or corrupt format.", cache_counters["decode_errors"])
+    render_value(lines, "cache_local_entries", "gauge", "Entries in this worker's local cache tier.", len(local_cache))
+    render_samples(lines, "token_cache_lookups_total", "counter", "Verified-token cache lookups.", ("result",),
+                   {"hit": TOKEN_CACHE.hits, "miss": TOKEN_CACHE.misses})
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Numbers are per worker process
+    lines = []
+    render_http(lines)
+    render_cache_metrics(lines)
+    render_mongo_metrics(lines)
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,34 +1,39 @@
 import json
-from fastapi import APIRouter, Request, HTTPException, Depends, Query, Body, UploadFile, File, Form
-from fastapi.security import OAuth2PasswordRequestForm
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, Query, Body, UploadFile, File, Form
+from fastapi.security import HTTPAuthorizationCredentials, OAuth2PasswordRequestForm
 from typing import List, Optional
 from datetime import datetime
 import os
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from db.models.users import ProfileSignature, UserModel, UserInput
 from db.models.stories import TextStoryInput, UserPreview, Story, StoryInput
 from routers.crud.users import (
-    create_user, get_user_by_id, get_all_users, login_user,
+    create_user, get_user_by_id, get_users_by_ids, get_all_users, login_user,
     update_refresh_token, remove_refresh_token,
-    update_user_profile, delete_user_account
+    update_user_profile, delete_user_account, MAX_BATCH_USERS
 )
 from routers.crud.stories import (
     create_media_story, create_text_story, get_stories_by_user_id, track_story_view,
-    update_story, delete_story
+    update_story, delete_story, get_story_engagement
 )
+from routers.crud.view_stats import get_view_stats_for_user
 
 from security.main import (
     create_access_token, create_refresh_token,
     decode_access_token
 )
-from security.dependencies import get_current_user
-from db.redis_client import get_cache, redis_client, set_cache
+from security.dependencies import auth_scheme, get_current_user
+from security.token_cache import revoke_token, token_digest
+from db.redis_client import get_or_load, redis_client
 
 from uuid import uuid4
 
 from routers.automations.recommendations.profile_signature import generate_profile_signature, infer_categories
-from routers.automations.recommendations.recommender import recommend_users, recommend_users_from_signature
+from routers.automations.recommendations.profile_scores import current_profile_scores
+from routers.automations.recommendations.recommender import (
+    RECOMMENDATION_CACHE_TTL, find_similar_users, get_recommendations, recommend_users_from_signature
+)
 
 router = APIRouter(prefix="/users", tags=["Users"])
 test_router = APIRouter(prefix="/test", tags=["Redis Test"])
@@ -128,9 +133,14 @@ async def refresh_token(request: Request, refresh_token: str):
 
 
 @router.post("/logout")
-async def logout(request: Request, current_user: dict = Depends(get_current_user)):
+async def logout(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+):
     db = request.app.mongodb
     await remove_refresh_token(db, current_user["user_id"])
+    await revoke_token(token_digest(token.credentials), exp=current_user.get("exp"))
     return {"message": "Logged out successfully"}
 
 
@@ -142,14 +152,38 @@ async def handle_get_user(user_id: str, request: Request):
     return await get_user_by_id(db, user_id)
 
 
+class UserBatchInput(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_USERS)
+
+@router.post("/get_users/users/batch")
+async def handle_get_users_batch(payload: UserBatchInput, request: Request):
+    # Previews in request order; unknown ids come back as null and are listed in `missing`
+    db = request.app.mongodb
+    users = await get_users_by_ids(db, payload.user_ids)
+    missing = [uid for uid, user in zip(payload.user_ids, users) if user is None]
+    return {"users": users, "missing": list(dict.fromkeys(missing))}
+
+
+@router.get("/{user_id}/similar")
+async def handle_similar_users(user_id: str, request: Request, limit: int = Query(10, ge=1, le=50)):
+    # Nearest profiles by tag Jaccard via MinHash LSH; cached like the explore lists
+    db = request.app.mongodb
+    return await get_or_load(f"similar:{user_id}:{limit}", lambda: find_similar_users(db, user_id, limit), ttl=3600)
+
+
 @router.get("/get_users/users", response_model=List[UserPreview])
 async def handle_get_all_users(
     request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
 ):
     db = request.app.mongodb
-    return await get_all_users(db, skip=skip, limit=limit)
+    users, next_cursor = await get_all_users(db, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
 
 
 @router.put("/update_user")
@@ -222,6 +256,28 @@ async def get_user_stories(user_id: str, request: Request):
     return await get_stories_by_user_id(db, user_id)
 
 
+@router.get("/stories/views")
+async def get_my_story_view_stats(request: Request, current_user: dict = Depends(get_current_user)):
+    db = request.app.mongodb
+    return await get_view_stats_for_user(db, current_user["user_id"])
+
+
+@router.get("/stories/{story_id}/engagement/{kind}")
+async def get_user_story_engagement(
+    story_id: str,
+    kind: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
+):
+    db = request.app.mongodb
+    records, next_cursor = await get_story_engagement(db, story_id, kind, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
+
+
 @router.put("/stories/{story_id}")
 async def update_user_story(
     story_id: str,
@@ -257,53 +313,58 @@ async def explore_without_login(payload: PublicExploreInput, request: Request):
     db = request.app.mongodb
     cache_key = f"public:{'-'.join(sorted(payload.interests or []))}:{payload.location or 'any'}"
 
-    # 1️⃣ Try Redis cache first
-    cached = await get_cache(cache_key)
-    if cached:
-        return cached
-
-    # 2️⃣ Normalize interests (lowercase)
-    interests = [i.lower() for i in payload.interests or []]
-
-    # 3️⃣ Build mock ProfileSignature
-    signature = ProfileSignature(
-        interests=interests,
-        behavioral_tags=interests,
-        bio_tags=[],
-        location=payload.location,
-        category=[],        # will be inferred below
-        category_test={},
-        profile_score=50
-    )
-
-    # 4️⃣ Infer umbrella categories
-    signature.category = infer_categories(signature)
-
-    # 5️⃣ Get recommendations
-    matches = await recommend_users_from_signature(db, signature)
-
-    # 6️⃣ Fallback if no match
-    if not matches:
-        fallback = await db.users.find(
-            {"profile_signature": {"$exists": True}}
-        ).sort("profile_signature.profile_score", -1).limit(10).to_list(10)
-
-        matches = [{
-            "user_id": u["user_id"],
-            "username": u.get("username"),
-            "profile_image_url": u.get("profile_image_url"),
-            "score": u.get("profile_signature", {}).get("profile_score", 50),
-            "reason": "Top users in system"
-        } for u in fallback]
+    # 1️⃣ Redis cache first; a miss is computed once even under concurrent requests
+    async def load():
+        # 2️⃣ Normalize interests (lowercase)
+        interests = [i.lower() for i in payload.interests or []]
+
+        # 3️⃣ Build mock ProfileSignature
+        signature = ProfileSignature(
+            interests=interests,
+            behavioral_tags=interests,
+            bio_tags=[],
+            location=payload.location,
+            category=[],        # will be inferred below
+            category_test={},
+            profile_score=50
+        )
+
+        # 4️⃣ Infer umbrella categories
+        signature.category = infer_categories(signature)
+
+        # 5️⃣ Get recommendations
+        matches = await recommend_users_from_signature(db, signature)
+
+        # 6️⃣ Fallback if no match
+        if not matches:
+            fallback = await db.users.find(
+                {"profile_signature": {"$exists": True}}
+            ).sort("profile_signature.profile_score", -1).limit(10).to_list(10)
+            scores = await current_profile_scores(fallback)
+            fallback.sort(key=lambda u: scores[u["user_id"]], reverse=True)
+
+            matches = [{
+                "user_id": u["user_id"],
+                "username": u.get("username"),
+                "profile_image_url": u.get("profile_image_url"),
+                "score": scores[u["user_id"]],
+                "reason": "Top users in system"
+            } for u in fallback]
+        return matches
 
     # 7️⃣ Cache & return
-    await set_cache(cache_key, matches, ttl=3600)
-    return matches
+    return await get_or_load(cache_key, load, ttl=3600)
 
 @router.get("/recommendations")
 async def get_recommendation_list(request: Request, current_user: dict = Depends(get_current_user)):
+    # Story feed; cached until the viewer's next interaction drops it (see interaction_queue)
     db = request.app.mongodb
-    return await recommend_users(db, current_user)
+    user_id = current_user["user_id"]
+
+    async def load():
+        return [sd.model_dump(mode="json") for sd in await get_recommendations(db, user_id)]
+
+    return await get_or_load(f"recommendations:{user_id}", load, ttl=RECOMMENDATION_CACHE_TTL)
 
 @router.post("/stories/viewed/{target_id}")
 async def mark_stories_viewed(
@@ -1,13 +1,28 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from db.redis_client import is_token_revoked
 from security.main import decode_access_token
+from security.token_cache import TOKEN_CACHE, token_digest
 
 auth_scheme = HTTPBearer()
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+async def get_current_user(token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    # Hot path: tokens verified earlier skip the HS256 check until they expire
+    key = token_digest(token.credentials)
+    if TOKEN_CACHE.is_revoked(key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    payload = TOKEN_CACHE.get(key)
+    if payload is not None:
+        return payload
     try:
         payload = decode_access_token(token.credentials)
-        return payload
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    # Not verified by this worker yet: it may have been revoked before this worker
+    # started, or while its invalidation listener was down
+    if await is_token_revoked(key):
+        TOKEN_CACHE.revoke(key, payload.get("exp"))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    TOKEN_CACHE.put(key, payload)
+    return payload
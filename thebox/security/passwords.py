@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+PASSWORD_WORKERS     = int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 32))    # waiting jobs before we shed load
+BCRYPT_TARGET_MS     = float(os.getenv("BCRYPT_TARGET_MS", 250))     # per-hash latency budget
+BCRYPT_ROUNDS        = os.getenv("BCRYPT_ROUNDS")                    # set to skip calibration
+BCRYPT_MIN_ROUNDS    = 10
+BCRYPT_MAX_ROUNDS    = 14
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _measure_rounds(rounds: int) -> float:
+    ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    started = time.perf_counter()
+    ctx.hash("calibration-password-1")
+    return (time.perf_counter() - started) * 1000
+
+
+def calibrate_bcrypt_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """Highest bcrypt cost factor whose hash time stays within `target_ms` on this machine."""
+    rounds = BCRYPT_MIN_ROUNDS
+    elapsed = _measure_rounds(rounds)
+    # Each extra round doubles the work
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+async def configure_password_hashing() -> int:
+    """Pick the bcrypt cost (env override or calibration) at startup; returns the rounds used."""
+    global pwd_context
+    if BCRYPT_ROUNDS:
+        rounds = int(BCRYPT_ROUNDS)
+    else:
+        rounds = await asyncio.get_running_loop().run_in_executor(_executor, calibrate_bcrypt_rounds)
+    pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds, deprecated="auto")
+    return rounds
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(pwd_context.verify, plain_password, hashed_password)
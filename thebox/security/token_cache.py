@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import os
+import time
+
+from security.main import ACCESS_TOKEN_EXPIRE_MINUTES
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10_000))
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    Size-bounded LRU of access tokens that already passed `jwt.decode`, keyed by
+    their SHA-256 digest (`token_digest`, computed once per request by the caller).
+    Entries disappear at the token's `exp`, so a cache hit is never more permissive
+    than re-verifying the token.
+
+    Revoked tokens are remembered (also until `exp`) so a logged-out token is
+    refused even though its signature is still valid. `revoke_token` also stores
+    the revocation in Redis, which callers check before caching a token this
+    worker has not verified yet, and tells the running workers.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, exp = entry
+        if exp <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: dict):
+        exp = payload.get("exp")
+        if exp is None:
+            return  # never cache a token that does not expire
+        self._entries[key] = (payload, float(exp))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, key: str) -> bool:
+        if not self._revoked:
+            return False
+        exp = self._revoked.get(key)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            del self._revoked[key]
+            return False
+        return True
+
+    def revoke(self, key: str, exp: Optional[float] = None):
+        """Drop a token from this worker's cache and refuse it until it expires."""
+        entry = self._entries.pop(key, None)
+        if exp is None and entry is not None:
+            exp = entry[1]
+        if exp is not None:
+            self._revoked[key] = float(exp)
+        now = time.time()
+        for k in [k for k, e in self._revoked.items() if e <= now]:
+            del self._revoked[k]
+
+    def clear_verified(self):
+        """Forget verified tokens (not revocations), so each is checked again on its next use."""
+        self._entries.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self._revoked.clear()
+        self.hits = self.misses = 0
+
+
+TOKEN_CACHE = VerifiedTokenCache()
+
+
+async def revoke_token(key: str, exp: Optional[float] = None):
+    """
+    Revoke a token (by digest) until it expires: in this worker, in Redis for
+    workers that verify it later, and over the cache invalidation channel in the
+    ones that may have it cached.
+    """
+    from db.redis_client import record_token_revocation
+    if exp is None:
+        exp = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    TOKEN_CACHE.revoke(key, exp)
+    await record_token_revocation(key, exp)